@@ -1,16 +1,45 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask.json.provider import DefaultJSONProvider
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g, Response, has_request_context, stream_with_context, abort
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta, date
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+from contextlib import contextmanager
 from flask_mail import Mail, Message
 import secrets
+import base64
+import hashlib
+import csv
+import io
+from itertools import groupby, islice, chain
+from collections import OrderedDict, defaultdict
+from types import MappingProxyType
+import click
 import random
+import heapq
+import re
 import os
 import psutil
 import json
-from threading import Thread
+import time
+import tempfile
+import gzip
+import mmap
+import struct
+from threading import Thread, Lock
+from sqlalchemy import text, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import defer, selectinload, load_only
+from sqlalchemy.pool import QueuePool
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 def send_async_email(app, msg):
     """Send email asynchronously"""
@@ -18,8 +47,13 @@ def send_async_email(app, msg):
         try:
             mail.send(msg)
             print("✅ Email sent successfully")
+            result = 'sent'
         except Exception as e:
             print(f"❌ Email failed: {e}")
+            result = 'failed'
+        if METRICS_ENABLED:
+            EMAIL_QUEUE_DEPTH.dec()
+            EMAILS_SENT.labels(result).inc()
 
 app = Flask(__name__, static_url_path='/static', static_folder='static', template_folder='templates')
 # ---------------- CONFIG ----------------
@@ -29,29 +63,74 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 ALLOWED_EXT = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+# The deployed code - part of cached page keys and ETags, so a deploy changes them
+with open(os.path.abspath(__file__), 'rb') as _app_source:
+    APP_VERSION = (os.environ.get('RAILWAY_GIT_COMMIT_SHA') or hashlib.sha256(_app_source.read()).hexdigest())[:12]
+
 app = Flask(__name__)
 app.secret_key = "auto_adeal_secret_change_this"
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=72)
-import os
 
 # Get database URL from environment variable
 DATABASE_URL = os.environ.get('DATABASE_URL') or os.environ.get('MYSQL_URL')
 
-# Debug: print what we got (remove this later)
-print(f"🔍 DATABASE_URL from env: {DATABASE_URL}")
-
 # Convert mysql:// to mysql+pymysql:// if needed
-if DATABASE_URL:
-    if DATABASE_URL.startswith('mysql://'):
-        DATABASE_URL = DATABASE_URL.replace('mysql://', 'mysql+pymysql://', 1)
-    print(f"✅ Using Railway database: {DATABASE_URL[:30]}...")
-else:
-    print("⚠️ No DATABASE_URL found, using localhost")
+if DATABASE_URL and DATABASE_URL.startswith('mysql://'):
+    DATABASE_URL = DATABASE_URL.replace('mysql://', 'mysql+pymysql://', 1)
 
 # Use environment variable or fallback to local
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or 'mysql+pymysql://root:@localhost/auto_adeal'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+def env_int(name, default):
+    """Read an integer setting from the environment"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        print(f"⚠️ Invalid {name}, using {default}")
+        return default
+
+def env_bool(name, default):
+    """Read a boolean setting from the environment"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Connection pool stats for /health (per worker process)
+POOL_STATS = {'checkouts': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+POOL_STATS_LOCK = Lock()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with POOL_STATS_LOCK:
+                POOL_STATS['checkouts'] += 1
+                POOL_STATS['wait_total'] += waited
+                POOL_STATS['wait_max'] = max(POOL_STATS['wait_max'], waited)
+
+# Pool sizing is per gunicorn worker: workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+# must stay below the database's max_connections.
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': TimedQueuePool,
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 5),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 280),  # Well below MySQL's wait_timeout
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+        'connect_args': {
+            'connect_timeout': env_int('DB_CONNECT_TIMEOUT', 10),
+            'read_timeout': env_int('DB_READ_TIMEOUT', 30),
+            'write_timeout': env_int('DB_WRITE_TIMEOUT', 30),
+        },
+    }
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
@@ -68,7 +147,6 @@ try:
     
     mail = Mail(app)
     MAIL_ENABLED = True
-    print("✅ Flask-Mail initialized successfully")
 except Exception as e:
     print(f"⚠️ Flask-Mail initialization failed: {e}")
     mail = None
@@ -90,6 +168,96 @@ def require_admin(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ---------------- METRICS ----------------
+# Metric values live in PROMETHEUS_MULTIPROC_DIR so /metrics can add up every
+# gunicorn worker. gunicorn.conf.py points it at a fresh directory on start.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'auto_adeal_metrics'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+
+    LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+    HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests', ['endpoint', 'method', 'status'])
+    HTTP_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency', ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+    HTTP_IN_PROGRESS = Gauge('http_requests_in_progress', 'HTTP requests being served', multiprocess_mode='livesum')
+    DB_QUERIES = Counter('db_queries_total', 'SQL statements executed', ['endpoint'])
+    DB_QUERY_TIME = Histogram('db_query_duration_seconds', 'SQL statement latency', ['endpoint'], buckets=LATENCY_BUCKETS)
+    CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups', ['cache', 'result'])
+    EMAIL_QUEUE_DEPTH = Gauge('email_queue_depth', 'Emails queued but not yet sent', multiprocess_mode='livesum')
+    EMAILS_SENT = Counter('emails_sent_total', 'Emails sent', ['result'])
+    METRICS_ENABLED = True
+except ImportError:
+    print("⚠️ prometheus_client not installed - /metrics disabled")
+    METRICS_ENABLED = False
+
+def metrics_endpoint_label():
+    """Route name for metric labels (bounded, unlike raw paths)"""
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'not_found'
+
+def record_cache(cache, hit):
+    """Count a cache hit or miss"""
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def queue_email(msg):
+    """Send an email from a background thread"""
+    if METRICS_ENABLED:
+        EMAIL_QUEUE_DEPTH.inc()
+    Thread(target=send_async_email, args=(app, msg)).start()
+
+@app.before_request
+def metrics_before_request():
+    g.request_start = time.perf_counter()
+    if METRICS_ENABLED:
+        HTTP_IN_PROGRESS.inc()
+
+@app.after_request
+def metrics_after_request(response):
+    if METRICS_ENABLED and 'request_start' in g:
+        endpoint = metrics_endpoint_label()
+        HTTP_REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+        HTTP_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - g.request_start)
+    return response
+
+@app.teardown_request
+def metrics_teardown_request(exc):
+    if METRICS_ENABLED and 'request_start' in g:
+        HTTP_IN_PROGRESS.dec()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def metrics_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, not the connection: a statement that raises never
+    # reaches after_cursor_execute, and mustn't skew the next one's timing
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def metrics_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_start', None)
+    if started is None:
+        return
+    if METRICS_ENABLED:
+        endpoint = metrics_endpoint_label()
+        DB_QUERIES.labels(endpoint).inc()
+        DB_QUERY_TIME.labels(endpoint).observe(time.perf_counter() - started)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for all workers. Set METRICS_TOKEN to require a bearer token."""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics disabled'}), 404
+
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
 # ---------------- MODELS ----------------
 subcategory_spectype = db.Table(
     'subcategory_spectype',
@@ -136,6 +304,10 @@ class Product(db.Model):
     image_urls = db.Column(db.Text, nullable=True)  # Comma-separated additional images
     tags = db.Column(db.Text, nullable=True)  # Comma-separated tags for search
     specs = db.relationship('ProductSpec', back_populates='product', cascade='all, delete-orphan')
+    __table_args__ = (
+        # Subcategory listing: subcategory_id + sold_out, then main_image filter
+        db.Index('ix_product_subcategory_stock', 'subcategory_id', 'sold_out', 'main_image'),
+    )
 
 class ProductSpec(db.Model):
     __tablename__ = 'product_spec'
@@ -145,6 +317,10 @@ class ProductSpec(db.Model):
     value = db.Column(db.Text)
     product = db.relationship('Product', back_populates='specs')
     spec_type = db.relationship('SpecType')
+    __table_args__ = (
+        db.Index('ix_product_spec_type_product', 'spectype_id', 'product_id'),  # Brand lookups
+        db.Index('ix_product_spec_product', 'product_id'),  # Product.specs loads
+    )
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -169,7 +345,20 @@ class ProductView(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.product_id'), nullable=False)
     search_query = db.Column(db.String(255), nullable=True)
+    visitor_id = db.Column(db.String(32), nullable=True)  # Browser session, for co-views
     viewed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_product_view_product_viewed', 'product_id', 'viewed_at'),
+        db.Index('ix_product_view_visitor_viewed', 'visitor_id', 'viewed_at'),
+    )
+
+class RelatedProduct(db.Model):
+    """Each product's related products, best first - rebuilt by precompute_related_products"""
+    __tablename__ = 'related_product'
+    product_id = db.Column(db.Integer, db.ForeignKey('product.product_id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('product.product_id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
 
 class DailyFeatured(db.Model):
     __tablename__ = 'daily_featured'
@@ -178,6 +367,9 @@ class DailyFeatured(db.Model):
     featured_date = db.Column(db.Date, nullable=False)
     display_order = db.Column(db.Integer, nullable=False)
     weight_category = db.Column(db.String(50))
+    __table_args__ = (
+        db.Index('ix_daily_featured_date_order', 'featured_date', 'display_order'),
+    )
 
 class SiteSettings(db.Model):
     __tablename__ = 'site_settings'
@@ -204,6 +396,12 @@ class Order(db.Model):
     notes = db.Column(db.Text, nullable=True)
     # Relationship to status history
     status_history = db.relationship('OrderStatusHistory', backref='order', cascade='all, delete-orphan', order_by='OrderStatusHistory.created_at')
+    items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan')
+    __table_args__ = (
+        db.Index('ix_order_status_created', 'status', 'created_at'),  # Admin list filtered by status
+        db.Index('ix_order_created', 'created_at'),  # Admin list, all orders
+        db.Index('ix_order_user_created', 'user_id', 'created_at'),  # Customer order history
+    )
 
 class OrderStatusHistory(db.Model):
     __tablename__ = 'order_status_history'
@@ -212,6 +410,24 @@ class OrderStatusHistory(db.Model):
     status = db.Column(db.String(20), nullable=False)
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_order_status_history_order_created', 'order_id', 'created_at'),
+    )
+
+class OrderItem(db.Model):
+    """One priced line of an order. Name and price are copied at order time."""
+    __tablename__ = 'order_item'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.order_id', ondelete='CASCADE'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.product_id', ondelete='SET NULL'), nullable=True)
+    product_name = db.Column(db.String(150), nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    line_total = db.Column(db.Float, nullable=False)
+    __table_args__ = (
+        db.Index('ix_order_item_order', 'order_id'),
+        db.Index('ix_order_item_product_order', 'product_id', 'order_id'),  # Per-product sales
+    )
 
 class BlogPost(db.Model):
     __tablename__ = 'blog_post'
@@ -221,38 +437,647 @@ class BlogPost(db.Model):
     image = db.Column(db.String(255), nullable=True)
     slug = db.Column(db.String(200), unique=True, nullable=False)
     published = db.Column(db.Boolean, default=True)
+    excerpt = db.Column(db.String(300), nullable=True)  # Plain-text teaser, set on save
+    reading_time = db.Column(db.Integer, nullable=True)  # Minutes, set on save
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_blog_post_published_created', 'published', 'created_at'),  # Public listing
+    )
+
+class IdempotencyKey(db.Model):
+    """Order already created for a client's Idempotency-Key"""
+    __tablename__ = 'idempotency_key'
+    key = db.Column(db.String(100), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.order_id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class SalesAggregate(db.Model):
+    """Order count, quantity and revenue per order-creation day and dimension"""
+    __tablename__ = 'sales_aggregate'
+    day = db.Column(db.Date, primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)  # status, city or product
+    dim_key = db.Column(db.String(100), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_sales_aggregate_dimension_day', 'dimension', 'day'),
+    )
+
+class CacheRevision(db.Model):
+    """Counter bumped whenever the data behind a group of caches changes"""
+    __tablename__ = 'cache_revision'
+    name = db.Column(db.String(50), primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ProductViewDaily(db.Model):
+    """Per-day view counts, rolled up from old ProductView rows"""
+    __tablename__ = 'product_view_daily'
+    product_id = db.Column(db.Integer, db.ForeignKey('product.product_id'), primary_key=True)
+    view_date = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+class ScheduledJob(db.Model):
+    """Last run and run-time stats of each scheduled job, shared by all workers"""
+    __tablename__ = 'scheduled_job'
+    name = db.Column(db.String(100), primary_key=True)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_duration_ms = db.Column(db.Integer, nullable=True)
+    max_duration_ms = db.Column(db.Integer, default=0)
+    total_duration_ms = db.Column(db.BigInteger, default=0)
+    runs = db.Column(db.Integer, default=0)
+    failures = db.Column(db.Integer, default=0)
+    skipped = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+# ---------------- SCHEMA MIGRATIONS ----------------
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migration'
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# (version, description, function(connection)) - applied in version order, once each
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a schema migration"""
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        return f
+    return decorator
+
+def create_index(conn, table_name, name, *columns):
+    """Create an index unless it exists. Migrations spell out their indexes
+    rather than reading the models, whose later columns may not exist yet."""
+    if name in {index['name'] for index in db.inspect(conn).get_indexes(table_name)}:
+        return
+    table = db.Table(table_name, db.MetaData(), *(db.Column(column, db.Integer) for column in columns))
+    db.Index(name, *(table.c[column] for column in columns)).create(bind=conn)
+
+def drop_index(conn, table_name, name):
+    """Drop an index if it exists"""
+    if name not in {index['name'] for index in db.inspect(conn).get_indexes(table_name)}:
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    if conn.dialect.name == 'mysql':
+        conn.execute(text(f'DROP INDEX {quote(name)} ON {quote(table_name)}'))
+    else:
+        conn.execute(text(f'DROP INDEX {quote(name)}'))
+
+@migration(1, 'Hot-path secondary indexes')
+def migration_0001_hot_path_indexes(conn):
+    create_index(conn, 'product', 'ix_product_subcategory_stock', 'subcategory_id', 'sold_out', 'main_image')
+    create_index(conn, 'product_spec', 'ix_product_spec_type_product', 'spectype_id', 'product_id')
+    create_index(conn, 'product_spec', 'ix_product_spec_product', 'product_id')
+    create_index(conn, 'product_view', 'ix_product_view_product_viewed', 'product_id', 'viewed_at')
+    create_index(conn, 'daily_featured', 'ix_daily_featured_date_order', 'featured_date', 'display_order')
+    create_index(conn, 'order', 'ix_order_status_created', 'status', 'created_at')
+    create_index(conn, 'order', 'ix_order_created', 'created_at')
+    create_index(conn, 'order', 'ix_order_user_created', 'user_id', 'created_at')
+    create_index(conn, 'order_status_history', 'ix_order_status_history_order_created', 'order_id', 'created_at')
+    create_index(conn, 'password_reset', 'ix_password_reset_token_used', 'token', 'used')
+
+@migration(2, 'Backfill order_item from order.order_items JSON')
+def migration_0002_backfill_order_items(conn):
+    OrderItem.__table__.create(bind=conn, checkfirst=True)
+    product_ids = {row[0] for row in conn.execute(db.select(Product.product_id))}
+
+    rows = []
+    orders = conn.execute(db.select(Order.order_id, Order.order_items)).yield_per(500)
+    for order_id, order_items in orders:
+        try:
+            items = json.loads(order_items or '[]')
+        except ValueError:
+            continue
+        for item in items:
+            try:
+                quantity = int(item.get('quantity') or 1)
+                price = float(item.get('price') or 0)
+            except (TypeError, ValueError, AttributeError):
+                continue
+            product_id = item.get('product_id')
+            rows.append({
+                'order_id': order_id,
+                'product_id': product_id if product_id in product_ids else None,
+                'product_name': str(item.get('name') or '')[:150],
+                'unit_price': price,
+                'quantity': quantity,
+                'line_total': price * quantity
+            })
+
+    for i in range(0, len(rows), 1000):
+        conn.execute(OrderItem.__table__.insert(), rows[i:i + 1000])
+
+@migration(3, 'Build sales_aggregate from existing orders')
+def migration_0003_build_sales_aggregates(conn):
+    SalesAggregate.__table__.create(bind=conn, checkfirst=True)
+    rebuild_sales_aggregates(conn)
+
+@migration(4, 'Add blog_post excerpt and reading_time')
+def migration_0004_blog_post_summary(conn):
+    existing = {column['name'] for column in db.inspect(conn).get_columns('blog_post')}
+    if 'excerpt' not in existing:
+        conn.execute(text('ALTER TABLE blog_post ADD COLUMN excerpt VARCHAR(300)'))
+    if 'reading_time' not in existing:
+        conn.execute(text('ALTER TABLE blog_post ADD COLUMN reading_time INTEGER'))
+    create_index(conn, 'blog_post', 'ix_blog_post_published_created', 'published', 'created_at')
+
+    table = BlogPost.__table__
+    for post_id, content in conn.execute(db.select(table.c.id, table.c.content)).all():
+        conn.execute(table.update().where(table.c.id == post_id).values(**blog_summary_fields(content)))
+
+@migration(5, 'Add product_view visitor_id and related_product')
+def migration_0005_related_products(conn):
+    existing = {column['name'] for column in db.inspect(conn).get_columns('product_view')}
+    if 'visitor_id' not in existing:
+        conn.execute(text('ALTER TABLE product_view ADD COLUMN visitor_id VARCHAR(32)'))
+    create_index(conn, 'product_view', 'ix_product_view_visitor_viewed', 'visitor_id', 'viewed_at')
+    RelatedProduct.__table__.create(bind=conn, checkfirst=True)
+
+@migration(6, 'Drop redundant password_reset token/used index')
+def migration_0006_drop_password_reset_token_used(conn):
+    drop_index(conn, 'password_reset', 'ix_password_reset_token_used')  # token has its own unique index
+
+@migration(7, 'Rebuild sales_aggregate without excluded-status revenue in city/product rows')
+def migration_0007_rebuild_sales_aggregates(conn):
+    rebuild_sales_aggregates(conn)
+
+def run_migrations():
+    """Apply pending migrations. Each one runs in its own transaction."""
+    SchemaMigration.__table__.create(bind=db.engine, checkfirst=True)
+    applied = {row.version for row in SchemaMigration.query.with_entities(SchemaMigration.version)}
+    db.session.rollback()  # Don't hold a transaction open while migrating
+
+    for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with db.engine.begin() as conn:
+            func(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+        print(f"✅ Applied migration {version:04d}: {description}")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations"""
+    db.create_all()
+    run_migrations()
+
+def hot_path_queries():
+    """The filters behind our busiest endpoints, as (label, select) pairs"""
+    today = date.today()
+    return [
+        ('/api/subcategory/<id>/products', Product.query.filter_by(subcategory_id=1, sold_out=False).filter(
+            Product.main_image.isnot(None), Product.main_image != '')),
+        ('/api/brands/<brand>/products', ProductSpec.query.filter_by(spectype_id=1)),
+        ('/api/products/popular', DailyFeatured.query.filter_by(featured_date=today).order_by(DailyFeatured.display_order)),
+        ('/api/admin/orders?status=', Order.query.filter_by(status='pending').order_by(Order.created_at.desc())),
+        ('/api/admin/orders', Order.query.order_by(Order.created_at.desc())),
+        ('/api/user/orders', Order.query.filter_by(user_id=1).order_by(Order.created_at.desc())),
+        ('order status history', OrderStatusHistory.query.filter_by(order_id=1).order_by(OrderStatusHistory.created_at)),
+        ('product views', ProductView.query.filter(ProductView.product_id == 1, ProductView.viewed_at >= datetime(2000, 1, 1))),
+        ('/api/auth/reset-password', PasswordReset.query.filter_by(token='x', used=False)),
+    ]
+
+def explain_uses_index(conn, statement):
+    """Run EXPLAIN for a statement and return (uses_index, plan_summary)"""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}').mappings().all()
+        details = [row['detail'] for row in rows]
+        # Every table access goes through an index or the rowid ("SCAN t" alone is a full scan)
+        accesses = [d for d in details if d.startswith(('SCAN', 'SEARCH'))]
+        return bool(accesses) and all('USING' in d for d in accesses), '; '.join(details)
+
+    # MySQL: no table read by a full scan. Tables reached through the primary key
+    # or as a const row may report no key, so the access type is what counts.
+    rows = conn.exec_driver_sql(f'EXPLAIN {compiled}').mappings().all()
+    return all(row.get('type') != 'ALL' for row in rows), ', '.join(
+        f"{row.get('table')}: {row.get('type')}/{row.get('key')}" for row in rows
+    )
+
+@app.cli.command('explain-indexes')
+def explain_indexes_command():
+    """Check that every hot-path query is served by an index (exit 1 if not)"""
+    failures = 0
+    with db.engine.connect() as conn:
+        for label, query in hot_path_queries():
+            uses_index, plan = explain_uses_index(conn, query.statement)
+            print(f"{'✓' if uses_index else '❌'} {label}: {plan}")
+            if not uses_index:
+                failures += 1
+    if failures:
+        raise SystemExit(1)
+
+# ---------------- STARTUP ----------------
+# Startup tasks run once per deployment (gunicorn master, see gunicorn.conf.py),
+# warm-up tasks run in every worker before it accepts requests.
+STARTUP_TASKS = []
+WARMUP_TASKS = []
+
+def startup_task(f):
+    """Register a function to run once per deployment"""
+    STARTUP_TASKS.append(f)
+    return f
+
+def warmup_task(f):
+    """Register a function to run in each worker before it serves traffic"""
+    WARMUP_TASKS.append(f)
+    return f
+
+@contextmanager
+def advisory_lock(name, timeout=0):
+    """Hold a named database-wide lock. Yields False if another process holds it.
+
+    Uses MySQL GET_LOCK; other databases (local SQLite) only ever have one
+    host, so a lock file is enough there (or no lock at all on Windows).
+    """
+    if db.engine.dialect.name != 'mysql':
+        if fcntl is None:
+            yield True
+            return
+        lock_path = os.path.join(tempfile.gettempdir(), secure_filename(name) + '.lock')
+        with open(lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+
+    with db.engine.connect() as conn:
+        acquired = conn.execute(text('SELECT GET_LOCK(:name, :timeout)'),
+                                {'name': name, 'timeout': timeout}).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': name})
+
+def run_tasks(tasks, label):
+    """Run registered tasks in order; a failing task doesn't stop the rest"""
+    for task in tasks:
+        start = time.perf_counter()
+        try:
+            task()
+            print(f"✓ {label} {task.__name__} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ {label} {task.__name__} failed: {e}")
+        finally:
+            db.session.remove()
+
+def run_startup_tasks():
+    """Run startup tasks unless another instance is already running them"""
+    with app.app_context():
+        with advisory_lock('auto_adeal:startup') as acquired:
+            if not acquired:
+                print("⏭️ Startup tasks already running in another instance")
+                return
+            run_tasks(STARTUP_TASKS, 'Startup')
+        # Don't hand pooled connections from the gunicorn master to forked workers
+        db.engine.dispose()
+
+def run_warmup_tasks():
+    """Prime connections and caches in this worker"""
+    with app.app_context():
+        run_tasks(WARMUP_TASKS, 'Warm-up')
+
+@app.cli.command('startup')
+def startup_command():
+    """Run the once-per-deployment startup tasks"""
+    run_startup_tasks()
+
+@startup_task
+def log_database_target():
+    engine_url = db.engine.url
+    print(f"🔍 Database: {engine_url.drivername} on {engine_url.host or engine_url.database}")
+
+@startup_task
+def apply_migrations():
+    db.create_all()
+    run_migrations()
+
+@warmup_task
+def warm_db_pool():
+    db.session.execute(text('SELECT 1'))
+
+@warmup_task
+def warm_templates():
+    page_shell('index.html')  # Compiles the template and builds its /assets/ files
+
+# ---------------- SCHEDULER ----------------
+# One worker at a time holds the scheduler lock and runs due jobs. Leadership
+# is given up every SCHEDULER_LEADER_TERM seconds so the lock connection never
+# sits idle long enough to be dropped; if the leader dies its lock goes with it.
+SCHEDULER_ENABLED = env_bool('SCHEDULER_ENABLED', True)
+SCHEDULER_TICK = env_int('SCHEDULER_TICK', 30)
+SCHEDULER_LEADER_TERM = env_int('SCHEDULER_LEADER_TERM', 300)
+
+# name -> {'func', 'interval'}
+SCHEDULED_JOBS = {}
+
+def scheduled_job(interval):
+    """Register a maintenance job to run every `interval` (a timedelta)"""
+    def decorator(f):
+        SCHEDULED_JOBS[f.__name__] = {'func': f, 'interval': interval}
+        return f
+    return decorator
+
+def run_job(name):
+    """Run a job now unless it's already running somewhere. Returns 'ok', 'failed' or 'skipped'."""
+    job = SCHEDULED_JOBS[name]
+
+    with advisory_lock(f'auto_adeal:job:{name}') as acquired:
+        state = db.session.get(ScheduledJob, name) or ScheduledJob(name=name)
+        db.session.add(state)
+
+        if not acquired:
+            state.skipped = (state.skipped or 0) + 1
+            db.session.commit()
+            print(f"⏭️ Job {name} is already running")
+            return 'skipped'
+
+        state.last_started_at = datetime.utcnow()
+        db.session.commit()
+
+        start = time.perf_counter()
+        error = None
+        try:
+            job['func']()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = str(e)
+            print(f"❌ Job {name} failed: {e}")
+
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        state = db.session.get(ScheduledJob, name)
+        state.last_finished_at = datetime.utcnow()
+        state.last_duration_ms = duration_ms
+        state.max_duration_ms = max(state.max_duration_ms or 0, duration_ms)
+        state.total_duration_ms = (state.total_duration_ms or 0) + duration_ms
+        state.runs = (state.runs or 0) + 1
+        if error:
+            state.failures = (state.failures or 0) + 1
+        state.last_error = error
+        db.session.commit()
+        return 'failed' if error else 'ok'
+
+def run_due_jobs():
+    """Run every job whose interval has passed since it last started"""
+    now = datetime.utcnow()
+    last_started = dict(db.session.query(ScheduledJob.name, ScheduledJob.last_started_at))
+    db.session.rollback()
+
+    for name, job in SCHEDULED_JOBS.items():
+        started_at = last_started.get(name)
+        if started_at is None or now - started_at >= job['interval']:
+            run_job(name)
+            db.session.remove()
+
+def scheduler_loop():
+    while True:
+        try:
+            with app.app_context():
+                with advisory_lock('auto_adeal:scheduler') as leader:
+                    term_end = time.monotonic() + SCHEDULER_LEADER_TERM
+                    while leader and time.monotonic() < term_end:
+                        run_due_jobs()
+                        db.session.remove()
+                        time.sleep(SCHEDULER_TICK)
+        except Exception as e:
+            print(f"❌ Scheduler error: {e}")
+        time.sleep(SCHEDULER_TICK)
+
+def start_scheduler():
+    """Start the scheduler thread in this worker (call after fork)"""
+    if not SCHEDULER_ENABLED:
+        return
+    Thread(target=scheduler_loop, name='scheduler', daemon=True).start()
+
+@app.cli.command('run-job')
+@click.argument('name')
+def run_job_command(name):
+    """Run a scheduled job immediately"""
+    if name not in SCHEDULED_JOBS:
+        raise click.BadParameter(f"Unknown job. Choose from: {', '.join(SCHEDULED_JOBS)}")
+    print(f"{name}: {run_job(name)}")
+
+# ---------------- JSON ----------------
+# jsonify() and the cached product fragments are encoded with orjson when it
+# is installed (several times faster than the json module), else with json.
+try:
+    import orjson
+except ImportError:
+    print("⚠️ orjson not installed - using the standard json encoder")
+    orjson = None
+
+def json_dumps(obj):
+    """Compact JSON bytes"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+if orjson:
+    class OrjsonProvider(DefaultJSONProvider):
+        """Flask's JSON provider with orjson doing the encoding. Dates, Decimals
+        etc. still go through Flask's default() so jsonify output is unchanged
+        apart from key order and whitespace."""
+
+        def encode(self, obj):
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.compact is False or (self.compact is None and self._app.debug):
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=self.default, option=option)
+
+        def dumps(self, obj, **kwargs):
+            return self.encode(obj).decode()
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(self.encode(obj), mimetype=self.mimetype)
+
+    app.json = OrjsonProvider(app)
+
+def json_array_response(fragments):
+    """JSON array response from already-encoded elements"""
+    return Response(b'[' + b','.join(fragments) + b']', mimetype='application/json')
 
 # ---------------- HELPER FUNCTIONS ----------------
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXT
 
+def encode_cursor(*values):
+    """Opaque keyset-pagination cursor from the last row's sort key"""
+    raw = json.dumps([v.isoformat() if isinstance(v, (datetime, date)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_limit(default=50, maximum=200):
+    """Page size from ?limit=, clamped to 1..maximum"""
+    return max(1, min(request.args.get('limit', default, type=int) or default, maximum))
+
+FLAG_TRUE_VALUES = ('1', 'true', 'yes', 'po', 'y', 'on')
+
+def parse_flag(value):
+    """A boolean request arg or JSON value (true, 1, "yes", "po", ...)"""
+    if isinstance(value, bool):
+        return value
+    return str(value if value is not None else '').strip().lower() in FLAG_TRUE_VALUES
+
+class ProductRecord:
+    """Immutable product as the public API shows it - safe to share between
+    threads and caches, unlike ORM instances. Holds exactly the fields of
+    format_product(), with images pre-split and specs pre-mapped."""
+
+    FIELDS = ('id', 'name', 'description', 'price', 'discount_price', 'is_special', 'sold_out',
+              'subcategory_id', 'main_image', 'images', 'tags', 'specs')
+    CARD_FIELDS = ('id', 'name', 'price', 'discount_price', 'sold_out', 'main_image')  # What a grid card shows
+    __slots__ = FIELDS + ('_json', '_card_json')
+
+    def __init__(self, id, name, description, price, discount_price, is_special, sold_out,
+                 subcategory_id, main_image, images, tags, specs, json_bytes=None):
+        for field, value in zip(self.FIELDS, (id, name, description, price, discount_price, is_special, sold_out,
+                                              subcategory_id, main_image, tuple(images), tags, MappingProxyType(dict(specs)))):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, '_json', json_bytes)
+        object.__setattr__(self, '_card_json', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ProductRecord is immutable')
+
+    @classmethod
+    def from_product(cls, product):
+        specs = {}
+        for spec in product.specs:
+            specs[spec.spec_type.name] = spec.value
+        
+        images = []
+        if product.image_urls:
+            images = [url.strip() for url in product.image_urls.split(',') if url.strip()]
+        
+        return cls(
+            id=product.product_id,
+            name=product.product_name,
+            description=product.description or "",
+            price=product.price,
+            discount_price=product.discount_price,
+            is_special=product.is_special,
+            sold_out=product.sold_out,
+            subcategory_id=product.subcategory_id,
+            main_image=product.main_image,
+            images=images,
+            tags=product.tags or "",
+            specs=specs
+        )
+
+    @classmethod
+    def from_json(cls, json_bytes):
+        """Record from its own json() output (keeps the bytes)"""
+        return cls(json_bytes=json_bytes, **json.loads(json_bytes))
+
+    def as_dict(self):
+        """format_product() dict - a fresh copy the caller may modify"""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['images'] = list(self.images)
+        data['specs'] = dict(self.specs)
+        return data
+
+    def card(self):
+        """Only the CARD_FIELDS, for product grids"""
+        return {field: getattr(self, field) for field in self.CARD_FIELDS}
+
+    def json(self, fields=None):
+        """as_dict() (or just `fields` of it) as compact JSON bytes. The full
+        and card encodings are done once per record."""
+        if fields is None:
+            if self._json is None:
+                object.__setattr__(self, '_json', json_dumps(self.as_dict()))
+            return self._json
+        if fields == self.CARD_FIELDS:
+            if self._card_json is None:
+                object.__setattr__(self, '_card_json', json_dumps(self.card()))
+            return self._card_json
+        data = self.as_dict()
+        return json_dumps({field: data[field] for field in fields})
+
 def format_product(product):
     """Convert product to JSON-friendly dict"""
-    specs = {}
-    for spec in product.specs:
-        specs[spec.spec_type.name] = spec.value
-    
-    images = []
-    if product.image_urls:
-        images = [url.strip() for url in product.image_urls.split(',') if url.strip()]
-    
+    return ProductRecord.from_product(product).as_dict()
+
+def product_card(product):
+    """ProductRecord.card() of an ORM product, without loading its specs"""
     return {
         "id": product.product_id,
         "name": product.product_name,
-        "description": product.description or "",
         "price": product.price,
         "discount_price": product.discount_price,
-        "is_special": product.is_special,
         "sold_out": product.sold_out,
-        "subcategory_id": product.subcategory_id,
-        "main_image": product.main_image,
-        "images": images,
-        "tags": product.tags or "",
-        "specs": specs
+        "main_image": product.main_image
     }
 
+def product_fields():
+    """Fields listing endpoints return: ?view=card for grid cards, ?fields=a,b for a
+    subset (unknown names are ignored, id is always included), else everything"""
+    if request.args.get('view') == 'card':
+        return ProductRecord.CARD_FIELDS
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    wanted = {field.strip() for field in fields.split(',')}
+    return tuple(field for field in ProductRecord.FIELDS if field == 'id' or field in wanted)
+
+# product_id -> (catalog revision, ProductRecord). Every product write bumps the
+# catalog revision (catalog_changed), so the revision versions each entry.
+PRODUCT_RECORD_CACHE_SIZE = env_int('PRODUCT_RECORD_CACHE_SIZE', 5000)
+PRODUCT_RECORD_CACHE = OrderedDict()
+PRODUCT_RECORD_CACHE_LOCK = Lock()
+
+def product_record(product, revision):
+    """Shared ProductRecord of an ORM product at a catalog revision"""
+    with PRODUCT_RECORD_CACHE_LOCK:
+        cached = PRODUCT_RECORD_CACHE.get(product.product_id)
+        if cached is not None and cached[0] == revision:
+            PRODUCT_RECORD_CACHE.move_to_end(product.product_id)
+    hit = cached is not None and cached[0] == revision
+    record_cache('product_record', hit)
+    if hit:
+        return cached[1]
+
+    record = ProductRecord.from_product(product)  # Loads specs only on a miss
+    with PRODUCT_RECORD_CACHE_LOCK:
+        PRODUCT_RECORD_CACHE[product.product_id] = (revision, record)
+        PRODUCT_RECORD_CACHE.move_to_end(product.product_id)
+        while len(PRODUCT_RECORD_CACHE) > PRODUCT_RECORD_CACHE_SIZE:
+            PRODUCT_RECORD_CACHE.popitem(last=False)
+    return record
+
+def products_response(products):
+    """JSON list of format_product() (or product_fields() of it) for ORM products,
+    from cached encoded records"""
+    revision = current_revision('catalog')
+    fields = product_fields()
+    return json_array_response(product_record(p, revision).json(fields) for p in products)
+
 def ping_google_sitemap():
     """Notify Google of sitemap update"""
     try:
@@ -261,6 +1086,30 @@ def ping_google_sitemap():
         print("✅ Pinged Google about sitemap update")
     except:
         pass  # Don't fail if ping fails
+
+def bump_revision(name):
+    """Increment a cache revision as part of the current transaction"""
+    updated = CacheRevision.query.filter_by(name=name).update(
+        {'revision': CacheRevision.revision + 1, 'updated_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CacheRevision(name=name, revision=1))
+    if has_request_context():
+        g.get('cache_revisions', {}).pop(name, None)  # Drop current_revision()'s per-request copy
+
+@app.cli.command('bump-revision')
+@click.argument('name')
+def bump_revision_command(name):
+    """Invalidate caches versioned by a revision (e.g. after editing categories in SQL)"""
+    bump_revision(name)
+    db.session.commit()
+    print(f"{name}: revision {current_revision(name)}")
+
+def catalog_changed():
+    """Call once per product write (before commit): invalidates catalog caches, pings Google"""
+    bump_revision('catalog')
+    Thread(target=ping_google_sitemap, daemon=True).start()
     
 def create_admin_notification_email(order, cart_items):
     """Create admin notification email message"""
@@ -280,79 +1129,498 @@ def create_customer_confirmation_email(order, cart_items, customer_email):
         html=html_content
     )
 
-# ---------------- ROUTES ----------------
-@app.route('/subcategory/<int:subcategory_id>')
-@app.route('/subcategory/<int:subcategory_id>/<path:name>')
-def redirect_to_subcategory(subcategory_id, name=None):
-    """Redirect /subcategory/1/name to /#subcategory/1/name"""
-    from urllib.parse import quote
-    if name:
-        return redirect(f'/#subcategory/{subcategory_id}/{quote(name)}')
-    return redirect(f'/#subcategory/{subcategory_id}')
+# ---------------- COMPRESSION ----------------
+# Responses over COMPRESS_MIN_BYTES with a text-like mimetype are sent brotli
+# or gzip encoded, whichever the client prefers. Cached payloads (pages,
+# /assets/, static files) keep their encoded variants next to the cache entry
+# and are compressed once at the highest level; everything else is compressed
+# per response at a cheaper level.
+try:
+    import brotli
+except ImportError:
+    print("⚠️ brotli not installed - responses are gzip-compressed only")
+    brotli = None
+
+COMPRESS_MIN_BYTES = env_int('COMPRESS_MIN_BYTES', 1024)
+COMPRESS_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'application/ld+json',
+    'application/x-ndjson', 'image/svg+xml', 'image/x-icon'
+}
+STATIC_COMPRESS_CACHE_SIZE = env_int('STATIC_COMPRESS_CACHE_SIZE', 256)
+STATIC_COMPRESS_CACHE = OrderedDict()  # (path, mtime) -> payload, least recently used first
+STATIC_COMPRESS_LOCK = Lock()
+
+def negotiate_encoding():
+    """'br', 'gzip' or None, from the request's Accept-Encoding"""
+    offered = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+def compress(data, encoding, best=False):
+    """Encode bytes - best=True for payloads that are compressed once and cached"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else 4)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+def make_payload(data):
+    """Cacheable response body; encoded variants are added on first use"""
+    return {None: data}
+
+def payload_body(payload, encoding):
+    """Body of payload in encoding (None = identity), compressing it at most once"""
+    if encoding not in payload:
+        payload[encoding] = compress(payload[None], encoding, best=True)  # Racing threads just do it twice
+    return payload[encoding]
+
+def payload_response(payload, mimetype, status=200):
+    """Response for a cached payload, in the best encoding the client accepts"""
+    encoding = negotiate_encoding() if len(payload[None]) >= COMPRESS_MIN_BYTES else None
+    response = Response(payload_body(payload, encoding), status=status, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def static_payload(filename):
+    """Compression cache entry for a file in static/, keyed by its mtime"""
+    path = os.path.join(app.static_folder, filename)
+    key = (path, os.path.getmtime(path))
+    with STATIC_COMPRESS_LOCK:
+        payload = STATIC_COMPRESS_CACHE.get(key)
+        if payload is not None:
+            STATIC_COMPRESS_CACHE.move_to_end(key)
+    record_cache('static_compressed', payload is not None)
+    if payload is None:
+        with open(path, 'rb') as f:
+            payload = make_payload(f.read())
+        with STATIC_COMPRESS_LOCK:
+            STATIC_COMPRESS_CACHE[key] = payload
+            while len(STATIC_COMPRESS_CACHE) > STATIC_COMPRESS_CACHE_SIZE:
+                STATIC_COMPRESS_CACHE.popitem(last=False)
+    return payload
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200
+            or (response.is_streamed and not response.direct_passthrough)  # Generators (exports)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate_encoding()
+    if not encoding:
+        return response
+
+    if response.direct_passthrough:
+        # send_file() body - only static files get compressed (from the cache)
+        if request.endpoint != 'static':
+            return response
+        try:
+            payload = static_payload(request.view_args['filename'])
+        except OSError:
+            return response
+        if len(payload[None]) < COMPRESS_MIN_BYTES:
+            return response
+        response.close()
+        response.direct_passthrough = False
+        response.set_data(payload_body(payload, encoding))
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    # The encoded body is a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+# ---------------- ASSETS ----------------
+# Large inline <style>/<script> blocks of a page template are moved out into
+# content-hashed files under /assets/, served with immutable caching, so repeat
+# visits only download the HTML shell. Everything is built in memory from the
+# template source (no build step) and rebuilt when the template file changes.
+# Blocks with attributes (src, JSON-LD), Jinja syntax, or under
+# ASSET_MIN_BYTES stay inline.
+try:
+    import rjsmin
+    import rcssmin
+except ImportError:
+    print("⚠️ rjsmin/rcssmin not installed - assets are only whitespace-minified")
+    rjsmin = rcssmin = None
+
+ASSET_PAGES = ('index.html',)  # Public pages rendered through page_shell() - the only ones /assets/ builds
+ASSET_MIN_BYTES = env_int('ASSET_MIN_BYTES', 1024)
+ASSET_MAX_AGE = 365 * 24 * 3600
+INLINE_ASSET_RE = re.compile(r'<(script|style)>(.*?)</\1>', re.S)
+
+ASSETS = {}  # filename -> (payload, mimetype); kept for every build so old shells still resolve
+ASSET_SHELLS = {}  # template name -> (uptodate check, compiled shell template, shell hash)
+TEMPLATE_VERSIONS = {}  # template name -> (uptodate check, source hash), for other templates
+ASSETS_LOCK = Lock()
+
+def minify_css(source):
+    if rcssmin:
+        return rcssmin.cssmin(source)
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    return re.sub(r'\s*([{};,>])\s*', r'\1', source).strip()
+
+def minify_js(source):
+    if rjsmin:
+        return rjsmin.jsmin(source)
+    # Whitespace only - stripping comments safely needs a real tokenizer
+    return '\n'.join(line.strip() for line in source.splitlines() if line.strip())
+
+def build_page_assets(source, stem):
+    """(shell source, {filename: (content, mimetype)}) with big inline blocks moved out"""
+    built = {}
+
+    def extract(match):
+        tag, body = match.group(1), match.group(2)
+        if len(body) < ASSET_MIN_BYTES or '{{' in body or '{%' in body or '{#' in body:
+            return match.group(0)
+        if tag == 'script':
+            content, ext, mimetype = minify_js(body), 'js', 'application/javascript'
+        else:
+            content, ext, mimetype = minify_css(body), 'css', 'text/css'
+        content = content.encode()
+        filename = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}.{ext}'
+        built[filename] = (make_payload(content), mimetype)
+        if tag == 'script':
+            return f'<script src="/assets/{filename}"></script>'
+        return f'<link rel="stylesheet" href="/assets/{filename}">'
+
+    return INLINE_ASSET_RE.sub(extract, source), built
+
+def page_shell(template_name):
+    """Compiled template_name with its inline assets moved out - pass to render_template"""
+    with ASSETS_LOCK:
+        cached = ASSET_SHELLS.get(template_name)
+    if cached and cached[0]():
+        return cached[1]
+
+    source, _, uptodate = app.jinja_loader.get_source(app.jinja_env, template_name)
+    shell, built = build_page_assets(source, os.path.splitext(template_name)[0])
+    template = app.jinja_env.from_string(shell)
+    version = hashlib.sha256(shell.encode()).hexdigest()[:12]
+    with ASSETS_LOCK:
+        ASSETS.update(built)
+        ASSET_SHELLS[template_name] = (uptodate or (lambda: True), template, version)
+    print(f"📦 Built {template_name} assets: {', '.join(built) or 'none'}")
+    return template
+
+def template_version(template_name):
+    """Hash of the template a page renders - for page_shell() pages the shell,
+    so it also changes with the page's asset fingerprints"""
+    if template_name in ASSET_PAGES:
+        page_shell(template_name)
+        with ASSETS_LOCK:
+            return ASSET_SHELLS[template_name][2]
+
+    with ASSETS_LOCK:
+        cached = TEMPLATE_VERSIONS.get(template_name)
+    if cached and cached[0]():
+        return cached[1]
+    source, _, uptodate = app.jinja_loader.get_source(app.jinja_env, template_name)
+    version = hashlib.sha256(source.encode()).hexdigest()[:12]
+    with ASSETS_LOCK:
+        TEMPLATE_VERSIONS[template_name] = (uptodate or (lambda: True), version)
+    return version
+
+@app.route('/assets/<filename>')
+def asset(filename):
+    """Fingerprinted page asset - the name changes with the content, so cache it forever"""
+    with ASSETS_LOCK:
+        found = ASSETS.get(filename)
+    if found is None:
+        # Linked from a page this worker hasn't rendered yet - build that page's assets.
+        # Only for public pages: other templates (admin) must not have their scripts served.
+        template_name = filename.split('.', 1)[0] + '.html'
+        if template_name not in ASSET_PAGES:
+            return jsonify({'error': 'Not found'}), 404
+        try:
+            page_shell(template_name)
+        except Exception:
+            pass
+        with ASSETS_LOCK:
+            found = ASSETS.get(filename)
+        if found is None:
+            return jsonify({'error': 'Not found'}), 404
+
+    payload, mimetype = found
+    etag = filename.rsplit('.', 2)[1]
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = payload_response(payload, mimetype)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+# ---------------- SERVER-RENDERED PAGES ----------------
+# Crawlable HTML for product, subcategory, brand and blog URLs, with the data the
+# page's script needs embedded as JSON, so first paint takes a single request.
+# Whole pages are cached per worker, keyed by the cache revision they depend on
+# (catalog_changed() / bump_revision('blog') make old entries unreachable) and by
+# the deployed code and template, so a deploy never revalidates old HTML.
+PAGE_CACHE_SIZE = env_int('PAGE_CACHE_SIZE', 500)
+PAGE_CACHE = OrderedDict()  # (key, revision name, revision, app, template) -> html payload, least recently used first
+PAGE_CACHE_LOCK = Lock()
+
+def current_revision(name):
+    """Current value of a cache revision (0 if it was never bumped), read once per request"""
+    revisions = g.setdefault('cache_revisions', {}) if has_request_context() else {}
+    if name not in revisions:
+        revisions[name] = db.session.query(CacheRevision.revision).filter_by(name=name).scalar() or 0
+    return revisions[name]
+
+def cached_page(key, revision_name, template_name, render):
+    """HTML response for render() (which renders template_name), cached until
+    revision_name is bumped or the code or template changes
+
+    Also answers If-None-Match with 304, so repeat visits skip the body.
+    """
+    cache_key = (key, revision_name, current_revision(revision_name), APP_VERSION, template_version(template_name))
+    etag = hashlib.md5(repr(cache_key).encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        with PAGE_CACHE_LOCK:
+            payload = PAGE_CACHE.get(cache_key)
+            if payload is not None:
+                PAGE_CACHE.move_to_end(cache_key)
+        record_cache('page', payload is not None)
+
+        if payload is None:
+            payload = make_payload(render().encode())  # render() may abort(404) - nothing is cached then
+            with PAGE_CACHE_LOCK:
+                PAGE_CACHE[cache_key] = payload
+                while len(PAGE_CACHE) > PAGE_CACHE_SIZE:
+                    PAGE_CACHE.popitem(last=False)
+        response = payload_response(payload, 'text/html')
+
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
 
 @app.route('/product/<int:product_id>')
-def redirect_to_product(product_id):
-    """Redirect /product/1 to /#product/1"""
-    return redirect(f'/#product/{product_id}')
+def product_page(product_id):
+    """Product detail page"""
+    def render():
+        product = Product.query.options(
+            selectinload(Product.specs).joinedload(ProductSpec.spec_type)
+        ).get_or_404(product_id)
+        return render_template('product_page.html',
+                               product=product_detail(product),
+                               subcategory=product.subcategory)
+    return cached_page(('product', product_id), 'catalog', 'product_page.html', render)
+
+@app.route('/subcategory/<int:subcategory_id>')
+@app.route('/subcategory/<int:subcategory_id>/<path:name>')
+def subcategory_page(subcategory_id, name=None):
+    """Subcategory product listing (the name segment is only for readable URLs)"""
+    def render():
+        subcategory = Subcategory.query.get_or_404(subcategory_id)
+        return render_template('product_list_page.html',
+                               title=subcategory.subcategory_name,
+                               heading=f'{subcategory.category.category_name} / {subcategory.subcategory_name}',
+                               canonical=f'/subcategory/{subcategory_id}/{subcategory.subcategory_name.replace(" ", "-")}',
+                               spa_url=f'/#subcategory/{subcategory_id}',
+                               products=[product_card(p) for p in subcategory_products(subcategory_id)])
+    return cached_page(('subcategory', subcategory_id), 'catalog', 'product_list_page.html', render)
 
 @app.route('/brand/<path:brand_name>')
-def redirect_to_brand(brand_name):
-    """Redirect /brand/BMW to /#brand/BMW"""
-    from urllib.parse import quote
-    return redirect(f'/#brand/{quote(brand_name)}')
+def brand_page(brand_name):
+    """Products that fit a car brand"""
+    def render():
+        from urllib.parse import quote
+        return render_template('product_list_page.html',
+                               title=brand_name,
+                               heading=f'Pjesë për {brand_name}',
+                               canonical=f'/brand/{quote(brand_name)}',
+                               spa_url=f'/#brand/{quote(brand_name)}',
+                               products=[product_card(p) for p in brand_products(brand_name)])
+    return cached_page(('brand', brand_name.lower()), 'catalog', 'product_list_page.html', render)
 
+@app.route('/blog')
+def blog_page():
+    """Blog listing page - first page of posts rendered in, the rest via /api/blog/posts"""
+    return cached_page(('blog',), 'blog', 'blog.html', lambda: render_template('blog.html', page=blog_posts_page()))
+
+@app.route('/blog/<int:post_id>')
+def blog_post_page(post_id):
+    """Individual blog post page"""
+    def render():
+        post = BlogPost.query.filter_by(id=post_id, published=True).first_or_404()
+        return render_template('blog_post.html', post=blog_post_detail(post))
+    return cached_page(('blog_post', post_id), 'blog', 'blog_post.html', render)
+
+# ---------------- ROUTES ----------------
 @app.route('/')
 def home():
-    return render_template('index.html')
+    return render_template(page_shell('index.html'))
 
 @app.route('/health')
 def health():
     """Monitor app health"""
-    process = psutil.Process(os.getpid())
+    process = current_process()
     mem_info = process.memory_info()
     
     return {
         'status': 'healthy',
         'memory_mb': round(mem_info.rss / 1024 / 1024, 2),
-        'cpu_percent': process.cpu_percent()
+        'cpu_percent': process.cpu_percent(),
+        'db_pool': db_pool_status(),
+        'catalog_snapshot': catalog_snapshot_status()
+    }
+
+PROCESS = None
+
+def current_process():
+    """psutil handle for this worker, kept so cpu_percent() covers the time since the last call"""
+    global PROCESS
+    if PROCESS is None or PROCESS.pid != os.getpid():
+        PROCESS = psutil.Process(os.getpid())
+    return PROCESS
+
+@warmup_task
+def warm_cpu_sampler():
+    current_process().cpu_percent()
+
+def db_pool_status():
+    """Connection pool usage and checkout wait times for this worker"""
+    pool = db.engine.pool
+    with POOL_STATS_LOCK:
+        checkouts = POOL_STATS['checkouts']
+        wait_total = POOL_STATS['wait_total']
+        wait_max = POOL_STATS['wait_max']
+
+    status = {
+        'pid': os.getpid(),
+        'checkouts': checkouts,
+        'checkout_wait_avg_ms': round(wait_total / checkouts * 1000, 2) if checkouts else 0.0,
+        'checkout_wait_max_ms': round(wait_max * 1000, 2)
     }
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'in_use': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow
+        })
+    return status
 
 #BLOG PAGE ROUTES
-@app.route('/api/blog/posts')
-def get_blog_posts():
-    """Get all published blog posts"""
-    posts = BlogPost.query.filter_by(published=True).order_by(BlogPost.created_at.desc()).all()
-    return jsonify([{
+BLOG_EXCERPT_LENGTH = 200
+BLOG_WORDS_PER_MINUTE = 200
+
+# post id -> (updated_at, rendered html); a post edit changes updated_at, so stale entries just miss
+BLOG_HTML_CACHE = {}
+BLOG_HTML_CACHE_LOCK = Lock()
+
+def blog_summary_fields(content):
+    """Excerpt and reading time for a post body - stored on every save"""
+    plain = ' '.join(re.sub(r'<[^>]+>', ' ', content or '').split())
+    excerpt = plain
+    if len(plain) > BLOG_EXCERPT_LENGTH:
+        excerpt = plain[:BLOG_EXCERPT_LENGTH].rsplit(' ', 1)[0] + '...'
+    return {
+        'excerpt': excerpt,
+        'reading_time': max(1, round(len(plain.split()) / BLOG_WORDS_PER_MINUTE))
+    }
+
+def render_blog_content(post):
+    """Post body as HTML (line breaks become <br>), cached until the post's updated_at changes"""
+    with BLOG_HTML_CACHE_LOCK:
+        cached = BLOG_HTML_CACHE.get(post.id)
+    hit = cached is not None and cached[0] == post.updated_at
+    record_cache('blog_html', hit)
+    if hit:
+        return cached[1]
+
+    html = (post.content or '').replace('\r\n', '\n').replace('\n', '<br>')
+    with BLOG_HTML_CACHE_LOCK:
+        BLOG_HTML_CACHE[post.id] = (post.updated_at, html)
+    return html
+
+def blog_post_summary(post):
+    """List-view fields of a post (no body)"""
+    return {
         'id': post.id,
         'title': post.title,
-        'content': post.content,
+        'excerpt': post.excerpt or '',
+        'reading_time': post.reading_time or 1,
         'image': post.image,
         'slug': post.slug,
         'created_at': post.created_at.strftime('%Y-%m-%d')
-    } for post in posts])
+    }
+
+def blog_posts_page(cursor=None, limit=12):
+    """One page of published posts, newest first, without their bodies: {posts, next_cursor}"""
+    query = BlogPost.query.options(load_only(
+        BlogPost.id, BlogPost.title, BlogPost.excerpt, BlogPost.reading_time,
+        BlogPost.image, BlogPost.slug, BlogPost.created_at
+    )).filter_by(published=True)
+
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        created_at = datetime.fromisoformat(created_at)
+        query = query.filter(
+            (BlogPost.created_at < created_at) |
+            ((BlogPost.created_at == created_at) & (BlogPost.id < post_id))
+        )
+
+    posts = query.order_by(BlogPost.created_at.desc(), BlogPost.id.desc()).limit(limit + 1).all()
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+
+    return {
+        'posts': [blog_post_summary(post) for post in posts],
+        'next_cursor': encode_cursor(posts[-1].created_at, posts[-1].id) if has_more else None
+    }
+
+@app.route('/api/blog/posts')
+def get_blog_posts():
+    """Get a page of published blog posts, newest first, without their bodies
+
+    Query args: limit, cursor (next_cursor of the previous page).
+    """
+    try:
+        page = blog_posts_page(request.args.get('cursor'), parse_limit(default=12, maximum=50))
+        return jsonify({'success': True, **page})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+def blog_post_detail(post):
+    """blog_post_summary plus the body, raw and rendered"""
+    data = blog_post_summary(post)
+    data.update({
+        'content': post.content,
+        'content_html': render_blog_content(post),
+        'published': post.published
+    })
+    return data
 
 @app.route('/api/blog/post/<int:post_id>')
 def get_blog_post(post_id):
     """Get single blog post"""
     post = BlogPost.query.get_or_404(post_id)
-    return jsonify({
-        'id': post.id,
-        'title': post.title,
-        'content': post.content,
-        'image': post.image,
-        'slug': post.slug,
-        'created_at': post.created_at.strftime('%Y-%m-%d')
-    })
+    return jsonify(blog_post_detail(post))
 
 @app.route('/api/admin/blog/posts', methods=['GET'])
 @require_admin
 def admin_get_blog_posts():
     """Get all blog posts for admin"""
-    posts = BlogPost.query.order_by(BlogPost.created_at.desc()).all()
+    posts = BlogPost.query.options(defer(BlogPost.content)).order_by(BlogPost.created_at.desc()).all()
     return jsonify([{
         'id': post.id,
         'title': post.title,
-        'content': post.content[:100] + '...' if len(post.content) > 100 else post.content,
+        'content': post.excerpt or '',
         'image': post.image,
         'published': post.published,
         'created_at': post.created_at.strftime('%Y-%m-%d')
@@ -373,10 +1641,12 @@ def admin_create_blog_post():
             content=data['content'],
             image=data.get('image'),
             slug=slug,
-            published=data.get('published', True)
+            published=data.get('published', True),
+            **blog_summary_fields(data['content'])
         )
         
         db.session.add(post)
+        bump_revision('blog')
         db.session.commit()
         
         return jsonify({'success': True, 'post_id': post.id}), 201
@@ -393,10 +1663,14 @@ def admin_update_blog_post(post_id):
         data = request.json
         
         post.title = data.get('title', post.title)
-        post.content = data.get('content', post.content)
         post.image = data.get('image', post.image)
         post.published = data.get('published', post.published)
+        if 'content' in data and data['content'] != post.content:
+            post.content = data['content']
+            for field, value in blog_summary_fields(post.content).items():
+                setattr(post, field, value)
         
+        bump_revision('blog')
         db.session.commit()
         return jsonify({'success': True})
     except Exception as e:
@@ -410,6 +1684,7 @@ def admin_delete_blog_post(post_id):
     try:
         post = BlogPost.query.get_or_404(post_id)
         db.session.delete(post)
+        bump_revision('blog')
         db.session.commit()
         return jsonify({'success': True})
     except Exception as e:
@@ -439,39 +1714,365 @@ def test_email():
         return jsonify({'success': True, 'message': 'Test email sent'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
-    
-@app.route('/blog')
-def blog_page():
-    """Blog listing page"""
-    return render_template('blog.html')
 
-@app.route('/blog/<int:post_id>')
-def blog_post_page(post_id):
-    """Individual blog post page"""
-    return render_template('blog_post.html')
     
+# ---------------- CATALOG SNAPSHOT ----------------
+# A read-only binary file per catalog revision holding what the public catalog
+# endpoints serve: each product's JSON, its search fields, and id lists for
+# subcategories, brands, specials and search trigrams. Workers mmap it, so the
+# data sits once in the OS page cache instead of once per worker. A snapshot
+# is only used while it matches the current catalog revision; otherwise the
+# endpoints query the database and a background thread builds the new file.
+#
+# Layout (little-endian): header, product index sorted by id, key index sorted
+# by key, then the data the indexes point into.
+CATALOG_SNAPSHOT_ENABLED = env_bool('CATALOG_SNAPSHOT', True)
+CATALOG_SNAPSHOT_DIR = os.environ.get('CATALOG_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'auto_adeal_catalog'))
+CATALOG_SNAPSHOT_MAGIC = b'AACS'
+CATALOG_SNAPSHOT_FORMAT = 1
+SNAPSHOT_HEADER = struct.Struct('<4sIQdII')  # magic, format, revision, built_at, products, keys
+SNAPSHOT_PRODUCT = struct.Struct('<IQIQI')  # product_id, json offset/length, search doc offset/length
+SNAPSHOT_KEY = struct.Struct('<QIQI')  # key offset/length, ids offset/count
+SNAPSHOT_ID = struct.Struct('<I')
+
+SNAPSHOT_RECORD_CACHE_SIZE = env_int('SNAPSHOT_RECORD_CACHE_SIZE', 2000)
+
+CATALOG_SNAPSHOT = None  # This worker's mapped snapshot
+CATALOG_SNAPSHOT_LOCK = Lock()
+CATALOG_BUILD_LOCK = Lock()  # One background build per worker at a time
+
+class CatalogSnapshot:
+    """Memory-mapped, read-only catalog snapshot"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.revision, self.built_at, self.product_count, self.key_count = SNAPSHOT_HEADER.unpack_from(self.mm, 0)
+        if magic != CATALOG_SNAPSHOT_MAGIC or version != CATALOG_SNAPSHOT_FORMAT:
+            raise ValueError(f'{path} is not a catalog snapshot')
+        self.path = path
+        self.products_at = SNAPSHOT_HEADER.size
+        self.keys_at = self.products_at + self.product_count * SNAPSHOT_PRODUCT.size
+        self.records = OrderedDict()  # product_id -> ProductRecord, least recently used first
+        self.records_lock = Lock()
+
+    def _product(self, product_id):
+        """Index entry for product_id (binary search), or None"""
+        lo, hi = 0, self.product_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = SNAPSHOT_PRODUCT.unpack_from(self.mm, self.products_at + mid * SNAPSHOT_PRODUCT.size)
+            if entry[0] == product_id:
+                return entry
+            if entry[0] < product_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def product_json(self, product_id):
+        """format_product() of a product as JSON bytes, or None"""
+        entry = self._product(product_id)
+        if entry is None:
+            return None
+        return self.mm[entry[1]:entry[1] + entry[2]]
+
+    def record(self, product_id):
+        """ProductRecord of a product, or None - decoded once and shared while cached"""
+        with self.records_lock:
+            record = self.records.get(product_id)
+            if record is not None:
+                self.records.move_to_end(product_id)
+        record_cache('snapshot_record', record is not None)
+        if record is None:
+            product_json = self.product_json(product_id)
+            if product_json is None:
+                return None
+            record = ProductRecord.from_json(product_json)
+            with self.records_lock:
+                self.records[product_id] = record
+                while len(self.records) > SNAPSHOT_RECORD_CACHE_SIZE:
+                    self.records.popitem(last=False)
+        return record
+
+    def search_docs(self, product_ids=None):
+        """rank_search docs for the given ids (default: every product)"""
+        if product_ids is None:
+            entries = (SNAPSHOT_PRODUCT.unpack_from(self.mm, self.products_at + i * SNAPSHOT_PRODUCT.size)
+                       for i in range(self.product_count))
+        else:
+            entries = filter(None, (self._product(product_id) for product_id in sorted(product_ids)))
+        for entry in entries:
+            yield json.loads(self.mm[entry[3]:entry[3] + entry[4]])
+
+    def ids(self, key):
+        """Product ids stored under key, in stored order (empty if the key is missing)"""
+        key = key.encode()
+        lo, hi = 0, self.key_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key_off, key_len, ids_off, count = SNAPSHOT_KEY.unpack_from(self.mm, self.keys_at + mid * SNAPSHOT_KEY.size)
+            found = self.mm[key_off:key_off + key_len]
+            if found == key:
+                return struct.unpack_from(f'<{count}I', self.mm, ids_off)
+            if found < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return ()
+
+def trigrams(text_value):
+    return {text_value[i:i + 3] for i in range(len(text_value) - 2)}
+
+def write_catalog_snapshot(path, revision, products, lists):
+    """Write a snapshot file: products as (id, json bytes, search doc), lists as {key: [ids]}"""
+    products = sorted(products, key=lambda p: p[0])
+    keys = sorted((key.encode(), ids) for key, ids in lists.items())
+    data_at = SNAPSHOT_HEADER.size + len(products) * SNAPSHOT_PRODUCT.size + len(keys) * SNAPSHOT_KEY.size
+
+    data = io.BytesIO()
+    def append(blob):
+        offset = data_at + data.tell()
+        data.write(blob)
+        return offset
+
+    product_index = []
+    for product_id, product_json, doc in products:
+        doc_json = json_dumps(doc)
+        product_index.append(SNAPSHOT_PRODUCT.pack(
+            product_id, append(product_json), len(product_json), append(doc_json), len(doc_json)
+        ))
+    key_index = []
+    for key, ids in keys:
+        key_off = append(key)
+        key_index.append(SNAPSHOT_KEY.pack(key_off, len(key), append(struct.pack(f'<{len(ids)}I', *ids)), len(ids)))
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(CATALOG_SNAPSHOT_MAGIC, CATALOG_SNAPSHOT_FORMAT, revision, time.time(), len(products), len(keys)))
+        f.writelines(product_index)
+        f.writelines(key_index)
+        f.write(data.getbuffer())
+    os.replace(tmp_path, path)  # Readers see the whole file or none of it
+
+def catalog_snapshot_path(revision):
+    return os.path.join(CATALOG_SNAPSHOT_DIR, f'catalog-{revision}.bin')
+
+def build_catalog_snapshot():
+    """Write the snapshot of the current catalog revision, unless it exists. Returns its path."""
+    revision = current_revision('catalog')  # Read in the same transaction as the catalog below
+    path = catalog_snapshot_path(revision)
+    if os.path.exists(path):
+        return path
+
+    start = time.perf_counter()
+    products = Product.query.options(
+        selectinload(Product.specs).joinedload(ProductSpec.spec_type)
+    ).order_by(Product.product_id).all()
+
+    entries = []
+    lists = {}
+    def add(key, product_id):
+        lists.setdefault(key, []).append(product_id)
+
+    for product in products:
+        doc = search_doc(product)
+        entries.append((product.product_id, ProductRecord.from_product(product).json(), doc))
+
+        # Same selections as the database queries in the endpoints
+        if product.is_special or product.discount_price is not None:
+            add('specials', product.product_id)
+        if product.main_image:
+            for spec in product.specs:
+                if spec.spec_type.name == BRAND_SPEC_NAME and spec.value:
+                    for brand in {b.strip().lower() for b in spec.value.split(',')}:
+                        add(f'brand:{brand}', product.product_id)
+        for gram in trigrams(' '.join(doc[1:5])):
+            add(f'tri:{gram}', product.product_id)
+
+    # Subcategory listings: in stock first, sold out at the end, image required
+    for product in products:
+        if product.main_image and product.sold_out is False:
+            add(f'sub:{product.subcategory_id}', product.product_id)
+    for product in products:
+        if product.main_image and product.sold_out is True:
+            add(f'sub:{product.subcategory_id}', product.product_id)
+
+    # Precomputed related products that are still in stock with an image
+    listed = {product.product_id for product in products if product.main_image and not product.sold_out}
+    related = db.session.query(RelatedProduct.product_id, RelatedProduct.related_id).order_by(
+        RelatedProduct.product_id, RelatedProduct.rank
+    )
+    for product_id, related_id in related:
+        if related_id in listed:
+            add(f'rel:{product_id}', related_id)
+
+    os.makedirs(CATALOG_SNAPSHOT_DIR, exist_ok=True)
+    write_catalog_snapshot(path, revision, entries, lists)
+    print(f"📦 Catalog snapshot r{revision}: {len(entries)} products, {len(lists)} keys, "
+          f"{os.path.getsize(path) // 1024} KB ({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+    # Keep the previous snapshot for workers still reading it
+    old = sorted((p for p in os.listdir(CATALOG_SNAPSHOT_DIR) if re.fullmatch(r'catalog-\d+\.bin', p)),
+                 key=lambda p: int(p[8:-4]))[:-2]
+    for name in old:
+        try:
+            os.remove(os.path.join(CATALOG_SNAPSHOT_DIR, name))
+        except OSError:
+            pass
+    return path
+
+def start_catalog_snapshot_build():
+    """Build the current snapshot in a background thread (one process at a time)"""
+    if not CATALOG_BUILD_LOCK.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            with app.app_context():
+                try:
+                    with advisory_lock('auto_adeal:catalog_snapshot') as acquired:
+                        if acquired:
+                            build_catalog_snapshot()
+                except Exception as e:
+                    print(f"❌ Catalog snapshot build failed: {e}")
+                finally:
+                    db.session.remove()
+        finally:
+            CATALOG_BUILD_LOCK.release()
+
+    Thread(target=run, daemon=True).start()
+
+def catalog_snapshot():
+    """The snapshot for the current catalog revision, or None - then use the database"""
+    global CATALOG_SNAPSHOT
+    if not CATALOG_SNAPSHOT_ENABLED:
+        return None
+
+    revision = current_revision('catalog')
+    snapshot = CATALOG_SNAPSHOT
+    if snapshot is not None and snapshot.revision == revision:
+        return snapshot
+
+    path = catalog_snapshot_path(revision)
+    if not os.path.exists(path):
+        start_catalog_snapshot_build()
+        return None
+    try:
+        snapshot = CatalogSnapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"❌ Can't map catalog snapshot: {e}")
+        return None
+    with CATALOG_SNAPSHOT_LOCK:
+        # The old mapping is closed once no request is using it any more
+        CATALOG_SNAPSHOT = snapshot
+    return snapshot
+
+def catalog_snapshot_status():
+    """Snapshot details for /health"""
+    snapshot = CATALOG_SNAPSHOT
+    if snapshot is None:
+        return None
+    return {
+        'revision': snapshot.revision,
+        'products': snapshot.product_count,
+        'size_kb': len(snapshot.mm) // 1024,
+        'age_seconds': round(time.time() - snapshot.built_at)
+    }
+
+def snapshot_products_response(snapshot, product_ids):
+    """JSON list of format_product() (or product_fields() of it) for product_ids,
+    straight from the snapshot"""
+    fields = product_fields()
+    if fields is None:
+        return json_array_response(filter(None, (snapshot.product_json(product_id) for product_id in product_ids)))
+    records = filter(None, map(snapshot.record, product_ids))
+    return json_array_response(record.json(fields) for record in records)
+
+@startup_task
+def prebuild_catalog_snapshot():
+    if CATALOG_SNAPSHOT_ENABLED:
+        build_catalog_snapshot()
+
+@warmup_task
+def map_catalog_snapshot():
+    catalog_snapshot()
+
 # ---------------- API ENDPOINTS ----------------
 
+CATEGORY_TREE = {'version': None, 'tree': [], 'json': b'[]'}
+
+@event.listens_for(db.session, 'before_flush')
+def bump_categories_revision(session, flush_context, instances):
+    """Any ORM write to categories, subcategories or spec types invalidates the category tree"""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (Category, Subcategory, SpecType)):
+            bump_revision('categories')
+            return
+
+def build_category_tree():
+    """Categories with their subcategories (by sort_order), each with its listed
+    product count and spec types - in one query"""
+    listed = db.select(Product.subcategory_id, db.func.count().label('product_count')).where(
+        Product.main_image.isnot(None), Product.main_image != ''
+    ).group_by(Product.subcategory_id).subquery()
+    rows = db.session.execute(
+        db.select(Category.category_id, Category.category_name, Category.slug,
+                  Subcategory.subcategory_id, Subcategory.subcategory_name, Subcategory.slug, listed.c.product_count,
+                  SpecType.id, SpecType.name, SpecType.value_type, SpecType.choices)
+        .select_from(Category)
+        .outerjoin(Subcategory, Subcategory.category_id == Category.category_id)
+        .outerjoin(listed, listed.c.subcategory_id == Subcategory.subcategory_id)
+        .outerjoin(subcategory_spectype, subcategory_spectype.c.subcategory_id == Subcategory.subcategory_id)
+        .outerjoin(SpecType, SpecType.id == subcategory_spectype.c.spectype_id)
+        .order_by(Category.category_id, Subcategory.sort_order, Subcategory.subcategory_id, SpecType.id)
+    ).all()
+
+    tree = []
+    for (category_id, category_name, category_slug), category_rows in groupby(rows, key=lambda row: row[:3]):
+        subcategories = []
+        for (sub_id, sub_name, sub_slug, product_count), sub_rows in groupby(category_rows, key=lambda row: row[3:7]):
+            if sub_id is None:
+                continue
+            subcategories.append({
+                "id": sub_id,
+                "name": sub_name,
+                "slug": sub_slug,
+                "product_count": product_count or 0,
+                "spec_types": [
+                    {
+                        "id": row[7],
+                        "name": row[8],
+                        "value_type": row[9],
+                        "choices": (row[10].split(',') if row[10] else [])
+                    }
+                    for row in sub_rows if row[7] is not None
+                ]
+            })
+        tree.append({
+            "id": category_id,
+            "name": category_name,
+            "slug": category_slug,
+            "subcategories": subcategories
+        })
+    return tree
+
+def category_tree():
+    """The cached category tree ('tree', and its JSON as 'json') - shared, don't modify.
+    Rebuilt when categories change or, for the product counts, the catalog does."""
+    global CATEGORY_TREE
+    version = (current_revision('categories'), current_revision('catalog'))
+    cached = CATEGORY_TREE
+    record_cache('category_tree', cached['version'] == version)
+    if cached['version'] != version:
+        tree = build_category_tree()
+        cached = CATEGORY_TREE = {'version': version, 'tree': tree, 'json': json_dumps(tree)}
+    return cached
+
 @app.route('/api/categories')
 def api_categories():
-    """Get all categories with subcategories (sorted by sort_order)"""
-    categories = Category.query.all()
-    output = []
-    for cat in categories:
-        output.append({
-            "id": cat.category_id,
-            "name": cat.category_name,
-            "slug": cat.slug,
-            "subcategories": [
-                {
-                    "id": sub.subcategory_id, 
-                    "name": sub.subcategory_name,
-                    "slug": sub.slug
-                }
-                for sub in cat.subcategories  # Already sorted by sort_order
-            ]
-        })
-    return jsonify(output)
+    """Get all categories with subcategories (sorted by sort_order), product counts and spec types"""
+    return Response(category_tree()['json'], mimetype='application/json')
 
 @app.route('/api/subcategory/<int:sub_id>/specs')
 def api_subcategory_specs(sub_id):
@@ -487,51 +2088,184 @@ def api_subcategory_specs(sub_id):
         })
     return jsonify(out)
 
-@app.route('/api/subcategory/<int:sub_id>/products')
-def api_subcategory_products(sub_id):
-    """Get all products in a subcategory, sold out items at end"""
-    Subcategory.query.get_or_404(sub_id)  # Verify subcategory exists
-    
+def subcategory_products(sub_id):
+    """Products of a subcategory that have an image, sold out items at end"""
     # Get in stock and sold out separately, filter out products without images
     in_stock = Product.query.filter_by(subcategory_id=sub_id, sold_out=False).filter(Product.main_image.isnot(None), Product.main_image != '').all()
     sold_out = Product.query.filter_by(subcategory_id=sub_id, sold_out=True).filter(Product.main_image.isnot(None), Product.main_image != '').all()
     
     # Combine: in stock first, sold out at end
-    products = in_stock + sold_out
+    return in_stock + sold_out
+
+@app.route('/api/subcategory/<int:sub_id>/products')
+def api_subcategory_products(sub_id):
+    """Get all products in a subcategory, sold out items at end"""
+    Subcategory.query.get_or_404(sub_id)  # Verify subcategory exists
+    snapshot = catalog_snapshot()
+    if snapshot:
+        return snapshot_products_response(snapshot, snapshot.ids(f'sub:{sub_id}'))
+    return products_response(subcategory_products(sub_id))
+
+RELATED_PRODUCTS_COUNT = env_int('RELATED_PRODUCTS_COUNT', 6)
+RELATED_VIEWS_PER_VISITOR = 20  # Only a visitor's latest views count as viewed together
+# Only the newest products of each brand, tag and subcategory are candidates,
+# so scoring stays linear in the catalog size however big a group gets
+RELATED_GROUP_CANDIDATES = env_int('RELATED_GROUP_CANDIDATES', 100)
+# Score = co-views (relative to the product's most co-viewed) + the share of its
+# brands and tags a candidate has too + a same-subcategory bonus, weighted:
+RELATED_WEIGHTS = {'coview': 3.0, 'brand': 1.0, 'tag': 1.0, 'subcategory': 0.5}
+
+def related_products(product_id):
+    """Cards of a product's precomputed related products that are still in stock
+    with an image (as in the snapshot's rel: lists), best first"""
+    products = Product.query.options(
+        load_only(Product.product_id, Product.product_name, Product.price, Product.discount_price,
+                  Product.sold_out, Product.main_image)
+    ).join(RelatedProduct, RelatedProduct.related_id == Product.product_id).filter(
+        RelatedProduct.product_id == product_id,
+        Product.sold_out == False,
+        Product.main_image.isnot(None),
+        Product.main_image != ''
+    ).order_by(RelatedProduct.rank).all()
+    return [product_card(p) for p in products]
+
+def product_detail(product):
+    """format_product plus its related products"""
+    related = related_products(product.product_id)
+    if not related:
+        # Not ranked yet (new product) - in-stock products of the same subcategory
+        related = [product_card(r) for r in Product.query.filter(
+            Product.subcategory_id == product.subcategory_id,
+            Product.product_id != product.product_id,
+            Product.sold_out == False,
+            Product.main_image.isnot(None),
+            Product.main_image != ''
+        ).order_by(Product.product_id).limit(RELATED_PRODUCTS_COUNT)]
     
-    return jsonify([format_product(p) for p in products])
+    result = format_product(product)
+    result['related'] = related
+    return result
+
+def co_viewed_products():
+    """{product_id: {other product_id: visitors who viewed both}} from the raw views"""
+    rows = db.session.query(ProductView.visitor_id, ProductView.product_id).filter(
+        ProductView.visitor_id.isnot(None)
+    ).order_by(ProductView.visitor_id, ProductView.viewed_at.desc()).yield_per(1000)
+
+    coviews = defaultdict(lambda: defaultdict(int))
+    for _, views in groupby(rows, key=lambda row: row[0]):
+        viewed = list(dict.fromkeys(product_id for _, product_id in views))[:RELATED_VIEWS_PER_VISITOR]
+        for product_id in viewed:
+            for other_id in viewed:
+                if other_id != product_id:
+                    coviews[product_id][other_id] += 1
+    return coviews
+
+@scheduled_job(timedelta(hours=6))
+def precompute_related_products():
+    """Rank every product's related products (in stock, with an image) into related_product"""
+    start = time.perf_counter()
+    products = Product.query.options(
+        load_only(Product.product_id, Product.subcategory_id, Product.main_image, Product.sold_out, Product.tags)
+    ).all()
+    candidates = {p.product_id for p in products if p.main_image and not p.sold_out}
+
+    brands = {}
+    brand_specs = db.session.query(ProductSpec.product_id, ProductSpec.value).join(SpecType).filter(
+        SpecType.name == BRAND_SPEC_NAME
+    )
+    for product_id, value in brand_specs:
+        brands.setdefault(product_id, set()).update(b.strip().lower() for b in (value or '').split(',') if b.strip())
+    tags = {p.product_id: {t.strip().lower() for t in (p.tags or '').split(',') if t.strip()} for p in products}
+
+    # Candidates by subcategory, brand and tag
+    by_subcategory, by_brand, by_tag = {}, {}, {}
+    for p in products:
+        if p.product_id in candidates:
+            by_subcategory.setdefault(p.subcategory_id, []).append(p.product_id)
+            for brand in brands.get(p.product_id, ()):
+                by_brand.setdefault(brand, []).append(p.product_id)
+            for tag in tags[p.product_id]:
+                by_tag.setdefault(tag, []).append(p.product_id)
+    for index in (by_subcategory, by_brand, by_tag):
+        for key, ids in index.items():
+            index[key] = heapq.nlargest(RELATED_GROUP_CANDIDATES, ids)
+    coviews = co_viewed_products()
+
+    rows = []
+    for p in products:
+        scores = defaultdict(float)
+        viewed_with = coviews.get(p.product_id)
+        if viewed_with:
+            most = max(viewed_with.values())
+            for other_id, count in viewed_with.items():
+                if other_id in candidates:
+                    scores[other_id] += RELATED_WEIGHTS['coview'] * count / most
+        for name, own, index in (('brand', brands.get(p.product_id, ()), by_brand),
+                                 ('tag', tags[p.product_id], by_tag)):
+            for value in own:
+                for other_id in index[value] if value in index else ():
+                    scores[other_id] += RELATED_WEIGHTS[name] / len(own)
+        for other_id in by_subcategory.get(p.subcategory_id, ()):
+            scores[other_id] += RELATED_WEIGHTS['subcategory']
+        scores.pop(p.product_id, None)
+
+        # Ties go to the newest product
+        best = heapq.nlargest(RELATED_PRODUCTS_COUNT, scores.items(), key=lambda item: (item[1], item[0]))
+        rows.extend({'product_id': p.product_id, 'rank': rank, 'related_id': other_id, 'score': round(score, 4)}
+                    for rank, (other_id, score) in enumerate(best))
+
+    # Only rewrite the lists that changed, and only drop the caches if any did
+    current, ranked = defaultdict(set), defaultdict(set)
+    for product_id, rank, related_id in db.session.query(
+            RelatedProduct.product_id, RelatedProduct.rank, RelatedProduct.related_id):
+        current[product_id].add((rank, related_id))
+    for row in rows:
+        ranked[row['product_id']].add((row['rank'], row['related_id']))
+    changed = [product_id for product_id in current.keys() | ranked.keys() if current[product_id] != ranked[product_id]]
+    if not changed:
+        print(f"🔗 Related products unchanged ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        return
+
+    changed_ids = set(changed)
+    changed_rows = [row for row in rows if row['product_id'] in changed_ids]
+    for i in range(0, len(changed), 1000):
+        RelatedProduct.query.filter(RelatedProduct.product_id.in_(changed[i:i + 1000])).delete(synchronize_session=False)
+    for i in range(0, len(changed_rows), 1000):
+        db.session.execute(RelatedProduct.__table__.insert(), changed_rows[i:i + 1000])
+    bump_revision('catalog')  # Product pages and the catalog snapshot pick up the new lists
+    print(f"🔗 Related products: {len(changed)} of {len(products)} lists changed "
+          f"({(time.perf_counter() - start) * 1000:.0f} ms)")
 
 @app.route('/api/product/<int:product_id>')
 def api_product_detail(product_id):
     """Get detailed product info with related products"""
+    snapshot = catalog_snapshot()
+    if snapshot:
+        record = snapshot.record(product_id)
+        if record is None:
+            abort(404)
+        related_ids = snapshot.ids(f'rel:{product_id}') or [
+            i for i in snapshot.ids(f'sub:{record.subcategory_id}') if i != product_id
+        ]
+        related = (r.card() for r in map(snapshot.record, related_ids) if not r.sold_out)
+        result = record.as_dict()
+        result['related'] = list(islice(related, RELATED_PRODUCTS_COUNT))
+        return jsonify(result)
+
     product = Product.query.get_or_404(product_id)
-    
-    # Get related products (same subcategory, exclude current)
-    related = Product.query.filter(
-        Product.subcategory_id == product.subcategory_id,
-        Product.product_id != product.product_id
-    ).limit(6).all()
-    
-    result = format_product(product)
-    result['related'] = [
-        {
-            "id": r.product_id,
-            "name": r.product_name,
-            "price": r.price,
-            "discount_price": r.discount_price,
-            "main_image": r.main_image
-        } for r in related
-    ]
-    
-    return jsonify(result)
+    return jsonify(product_detail(product))
 
 @app.route('/api/products/specials')
 def api_special_products():
     """Get products with discounts or marked as special"""
+    snapshot = catalog_snapshot()
+    if snapshot:
+        return snapshot_products_response(snapshot, snapshot.ids('specials'))
     products = Product.query.filter(
         (Product.discount_price.isnot(None)) | (Product.is_special == True)
     ).all()
-    return jsonify([format_product(p) for p in products])
+    return products_response(products)
 
 @app.route('/api/products/popular')
 def api_popular_products():
@@ -546,9 +2280,13 @@ def api_popular_products():
     cached = DailyFeatured.query.filter_by(featured_date=today).order_by(DailyFeatured.display_order).all()
     print(f"💾 Cached products found: {len(cached)}")  # Debug
     
+    record_cache('daily_featured', bool(cached))
     if cached and len(cached) > 0:
         # Return cached products
         product_ids = [c.product_id for c in cached]
+        snapshot = catalog_snapshot()
+        if snapshot:
+            return snapshot_products_response(snapshot, product_ids)
         products = Product.query.filter(Product.product_id.in_(product_ids)).all()
         
         # Sort by cached order
@@ -556,14 +2294,19 @@ def api_popular_products():
         ordered_products = [products_dict[pid] for pid in product_ids if pid in products_dict]
         
         print(f"✓ Returning {len(ordered_products)} cached products")  # Debug
-        return jsonify([format_product(p) for p in ordered_products])
+        return products_response(ordered_products)
     
     # Generate new daily rotation
     print("🔄 Generating new daily rotation...")  # Debug
+    selected = generate_daily_featured(today)
+    return products_response(selected)
+
+def generate_daily_featured(today):
+    """Pick and store the weighted featured selection for a day"""
     all_products = Product.query.all()
     
     if not all_products:
-        return jsonify([])
+        return []
     
     # Categorize products
     popular_products = []
@@ -651,95 +2394,98 @@ def api_popular_products():
         db.session.rollback()
         print(f"❌ Failed to cache products: {e}")  # Debug
     
-    return jsonify([format_product(p) for p in selected])
+    return selected
 
-@app.route('/api/search')
-def api_search():
-    """Smart search with relevance scoring and synonym support"""
-    query = request.args.get('q', '').strip().lower()
-    if not query:
-        return jsonify([])
-    
-    # Albanian stop words
-    stop_words = {"per", "dhe", "ose", "te", "me", "nga", "ne", "si", "qe", "eshte", "nje", "i", "e", "a", "u"}
-    
-    # Synonym map (Albanian automotive terms)
-    synonyms = {
-        'makine': ['makin', 'auto', 'veture', 'car'],
-        'butona': ['buton', 'buttons', 'switch', 'celes', 'celsa'],
-        'xhami': ['xhamash', 'xhamat', 'xhama', 'window'],
-        'veshje': ['mbulese', 'cover', 'mbrojtese', 'cover'],
-        'timoni': ['timon', 'timona', 'timonash', 'steering wheel'],
-        'leva': ['leve', 'shkop', 'kembe', 'gear', 'knob'],
-        'marshi': ['marsha', 'kamjo', 'manual', 'marshat', 'marshash', 'shift', 'shifter'],
-        'doreza': ['doreze', 'lecke', 'plastike', 'mbajtese', 'dore', 'handle'],
-        'dyersh': ['dere', 'dyert', 'dera', 'dyerve', 'door'],
-        'njesi': ['unit', 'komponent'],
-        'ac': ['air conditioner', 'air', 'ajer', 'ftohes', 'ftohesi', 'ftohsi'],
-        'vent': ['ventilator', 'kapak', 'plastike', 'plastik'],
-        'celsa': ['celsash', 'cels', 'celes', 'buton', 'butona', 'celsash'],
-        'celsash': ['celsa', 'cels', 'celes', 'buton', 'butona', 'celsash', 'key', 'keys'],
-        'varese': ['varse', 'keychain', 'holder'],
-        'aksesore': ['aksesor', 'parts', 'accessories', 'pjese'],
-        'pasqyre': ['pasqyrash', 'pasqyrat', 'pasqyr', 'mirror', 'mirrors'],
-        'dritash': ['drita', 'dritave', 'drite', 'drit', 'llampe', 'light', 'lights'],
-        'pedale': ['mbulese', 'mbulesa', 'mbrojtese', 'pedalesh', 'pedalet', 'pedals'],
-        'mbulesa': ['cover', 'mbulese', 'boot', 'roller', 'console'],
-        'sedilje': ['sendilje', 'ulse', 'ulese', 'karrige', 'karrike', 'seat', 'seats'],
-        'tapeta': ['shtresa', 'tapet', 'tepetash', 'mats', 'floor'],
-        'maskarino': ['maskarin', 'grill', 'gril', 'veshke', 'mushkri'],
-        'grila': ['maskarino', 'grill', 'maskarin', 'mjegulle', 'mjegull', 'cover'],
-        'sinjale': ['signals', 'indicator', 'indicators', 'sinjal', 'sinjalesh'],
-        'dinamike': ['dynamic', 'dinamik'],
-        'llampe': ['llampa', 'lampe', 'sinjal', 'llambe', 'llamba', 'stopash', 'drita', 'dritash', 'drite'],
-        'fenere': ['fener', 'drita', 'llampa', 'llampe', 'headlight', 'headlights'],
-        'stopa': ['tail lights', 'drita', 'mbrapme', 'mbrapa', 'stopat'],
-        'fshirese': ['pastruese', 'pastrues', 'pastrim', 'fshese', 'fshesa', 'cleaner'],
-        'leter': ['vinyl', 'wrap', 'tint', 'erresim', 'errsim'],
-        'tint': ['erresim', 'leter', 'vinyl', 'wrap', 'mbulese'],
-        'rezervuar': ['tank', 'depozite', 'depozita', 'depozit', 'mbajtese', 'reservoir'],
-        'coolant': ['antifriz', 'antifreeze', 'anti', 'freeze', 'ftohes', 'ftohje', 'coolanti', 'kullant'],
-        'xhamash': ['xhama', 'xhamat', 'xhamave', 'xhami', 'window', 'windshield'],
-        'veshje': ['mbulese', 'shtrese', 'shtres', 'mbrojtes', 'mbrojtese', 'coat', 'coating', 'cover'],
-        'qeramike': ['qeramik', 'graphene', 'qeramika', 'ceramic'],
-        'lecke': ['doreze', 'dorashk', 'mitt', 'glove', 'towel'],
-        'aditive': ['additive', 'aditiv', 'shtues', 'riparues', 'fuqizues', 'pastrues', 'shtese'],
-        'alkol': ['leng', 'uje'],
-        'vaj': ['lubrifikues', 'lubrifikant', 'oil', 'vaji', 'fluid', 'leng'],
-        'kapak': ['vent', 'ac', 'cover'],
-        'karikues': ['karikus', 'fuqizus', 'fuqizues', 'riparues', 'riparim', 'charger'],
-        'siguresa': ['fuse', 'sigures', 'sigurese'],
-        'universale': ['universal', 'gjitha', 'all'],
-        'halogjen': ['halogen', 'drita'],
-        'p21w': ['p21/5w', 'stopa'],
-        'ba15s': ['ba15d', 'bay15d', 'bau15s', 'baz15d'],
-        'kruajtes': ['scraper', 'kruajts', 'kruarje', 'krruajtes', 'krruajts', 'krruarje'],
-        'vinyl': ['leter', 'wrap', 'vinil', 'vinyli'],
-        'vinyli': ['leter', 'wrap', 'vinil', 'vinyl'],
-        'coolanti': ['antifriz', 'antifreeze', 'anti', 'freeze', 'ftohes', 'ftohje', 'coolant', 'kullant'],
-        'qafe': ['neck', 'tub', 'trup', 'kok', 'koke'],
-        'kapsula': ['pako', 'leng', 'xhami'],
-        'shkumeberes': ['shkume', 'shkum', 'shkumues', 'shkumator', 'beres', 'foam', 'cannon', 'shishe'],
-    }
-    
-    # Tokenize and clean query - remove stop words
-    tokens = [w.strip() for w in query.split() if w.strip() and w.strip() not in stop_words]
-    
-    if not tokens:
-        return jsonify([])
-    
-    print(f"🔍 Search tokens after cleaning: {tokens}")  # Debug
-    
-    # Get all products
-    all_products = Product.query.all()
+@scheduled_job(timedelta(hours=1))
+def precompute_featured_rotation():
+    """Generate today's featured rotation so no request has to"""
+    today = date.today()
+    if not DailyFeatured.query.filter_by(featured_date=today).first():
+        generate_daily_featured(today)
+
+# Albanian stop words
+SEARCH_STOP_WORDS = {"per", "dhe", "ose", "te", "me", "nga", "ne", "si", "qe", "eshte", "nje", "i", "e", "a", "u"}
+
+# Synonym map (Albanian automotive terms)
+SEARCH_SYNONYMS = {
+    'makine': ['makin', 'auto', 'veture', 'car'],
+    'butona': ['buton', 'buttons', 'switch', 'celes', 'celsa'],
+    'xhami': ['xhamash', 'xhamat', 'xhama', 'window'],
+    'veshje': ['mbulese', 'cover', 'mbrojtese', 'cover'],
+    'timoni': ['timon', 'timona', 'timonash', 'steering wheel'],
+    'leva': ['leve', 'shkop', 'kembe', 'gear', 'knob'],
+    'marshi': ['marsha', 'kamjo', 'manual', 'marshat', 'marshash', 'shift', 'shifter'],
+    'doreza': ['doreze', 'lecke', 'plastike', 'mbajtese', 'dore', 'handle'],
+    'dyersh': ['dere', 'dyert', 'dera', 'dyerve', 'door'],
+    'njesi': ['unit', 'komponent'],
+    'ac': ['air conditioner', 'air', 'ajer', 'ftohes', 'ftohesi', 'ftohsi'],
+    'vent': ['ventilator', 'kapak', 'plastike', 'plastik'],
+    'celsa': ['celsash', 'cels', 'celes', 'buton', 'butona', 'celsash'],
+    'celsash': ['celsa', 'cels', 'celes', 'buton', 'butona', 'celsash', 'key', 'keys'],
+    'varese': ['varse', 'keychain', 'holder'],
+    'aksesore': ['aksesor', 'parts', 'accessories', 'pjese'],
+    'pasqyre': ['pasqyrash', 'pasqyrat', 'pasqyr', 'mirror', 'mirrors'],
+    'dritash': ['drita', 'dritave', 'drite', 'drit', 'llampe', 'light', 'lights'],
+    'pedale': ['mbulese', 'mbulesa', 'mbrojtese', 'pedalesh', 'pedalet', 'pedals'],
+    'mbulesa': ['cover', 'mbulese', 'boot', 'roller', 'console'],
+    'sedilje': ['sendilje', 'ulse', 'ulese', 'karrige', 'karrike', 'seat', 'seats'],
+    'tapeta': ['shtresa', 'tapet', 'tepetash', 'mats', 'floor'],
+    'maskarino': ['maskarin', 'grill', 'gril', 'veshke', 'mushkri'],
+    'grila': ['maskarino', 'grill', 'maskarin', 'mjegulle', 'mjegull', 'cover'],
+    'sinjale': ['signals', 'indicator', 'indicators', 'sinjal', 'sinjalesh'],
+    'dinamike': ['dynamic', 'dinamik'],
+    'llampe': ['llampa', 'lampe', 'sinjal', 'llambe', 'llamba', 'stopash', 'drita', 'dritash', 'drite'],
+    'fenere': ['fener', 'drita', 'llampa', 'llampe', 'headlight', 'headlights'],
+    'stopa': ['tail lights', 'drita', 'mbrapme', 'mbrapa', 'stopat'],
+    'fshirese': ['pastruese', 'pastrues', 'pastrim', 'fshese', 'fshesa', 'cleaner'],
+    'leter': ['vinyl', 'wrap', 'tint', 'erresim', 'errsim'],
+    'tint': ['erresim', 'leter', 'vinyl', 'wrap', 'mbulese'],
+    'rezervuar': ['tank', 'depozite', 'depozita', 'depozit', 'mbajtese', 'reservoir'],
+    'coolant': ['antifriz', 'antifreeze', 'anti', 'freeze', 'ftohes', 'ftohje', 'coolanti', 'kullant'],
+    'xhamash': ['xhama', 'xhamat', 'xhamave', 'xhami', 'window', 'windshield'],
+    'veshje': ['mbulese', 'shtrese', 'shtres', 'mbrojtes', 'mbrojtese', 'coat', 'coating', 'cover'],
+    'qeramike': ['qeramik', 'graphene', 'qeramika', 'ceramic'],
+    'lecke': ['doreze', 'dorashk', 'mitt', 'glove', 'towel'],
+    'aditive': ['additive', 'aditiv', 'shtues', 'riparues', 'fuqizues', 'pastrues', 'shtese'],
+    'alkol': ['leng', 'uje'],
+    'vaj': ['lubrifikues', 'lubrifikant', 'oil', 'vaji', 'fluid', 'leng'],
+    'kapak': ['vent', 'ac', 'cover'],
+    'karikues': ['karikus', 'fuqizus', 'fuqizues', 'riparues', 'riparim', 'charger'],
+    'siguresa': ['fuse', 'sigures', 'sigurese'],
+    'universale': ['universal', 'gjitha', 'all'],
+    'halogjen': ['halogen', 'drita'],
+    'p21w': ['p21/5w', 'stopa'],
+    'ba15s': ['ba15d', 'bay15d', 'bau15s', 'baz15d'],
+    'kruajtes': ['scraper', 'kruajts', 'kruarje', 'krruajtes', 'krruajts', 'krruarje'],
+    'vinyl': ['leter', 'wrap', 'vinil', 'vinyli'],
+    'vinyli': ['leter', 'wrap', 'vinil', 'vinyl'],
+    'coolanti': ['antifriz', 'antifreeze', 'anti', 'freeze', 'ftohes', 'ftohje', 'coolant', 'kullant'],
+    'qafe': ['neck', 'tub', 'trup', 'kok', 'koke'],
+    'kapsula': ['pako', 'leng', 'xhami'],
+    'shkumeberes': ['shkume', 'shkum', 'shkumues', 'shkumator', 'beres', 'foam', 'cannon', 'shishe'],
+}
+
+def search_tokens(query):
+    """Query words minus stop words"""
+    return [w.strip() for w in query.split() if w.strip() and w.strip() not in SEARCH_STOP_WORDS]
+
+def search_terms(token):
+    """What a token matches: its synonyms, or the token itself"""
+    return SEARCH_SYNONYMS.get(token, [token])
+
+def rank_search(query, tokens, docs):
+    """Ids of the best 50 matches, best first
+
+    docs yields (product_id, title, description, tags, specs, has_image,
+    is_promo) with the text fields lowercased. A product matches when every
+    token (or one of its synonyms) appears somewhere in its text.
+    """
     scored_products = []
     
-    for product in all_products:
-        # Build searchable fields
-        title_text = product.product_name.lower()
-        desc_text = (product.description or '').lower()
-        tags_text = (product.tags or '').lower()
-        specs_text = ' '.join([spec.value.lower() for spec in product.specs])
+    for product_id, title_text, desc_text, tags_text, specs_text, has_image, is_promo in docs:
+        # Only products with an image are shown
+        if not has_image:
+            continue
         
         # Combine all text for checking
         all_text = f"{title_text} {desc_text} {tags_text} {specs_text}"
@@ -751,13 +2497,8 @@ def api_search():
         for token in tokens:
             token_found = False
             
-            # Get synonyms for this token
-            search_terms = [token]
-            if token in synonyms:
-                search_terms = synonyms[token]
-            
             # Check if any synonym matches
-            for term in search_terms:
+            for term in search_terms(token):
                 if term in all_text:
                     token_found = True
                     
@@ -779,30 +2520,84 @@ def api_search():
                 break
         
         # Only include if ALL tokens were found
-        if all_tokens_found and product.main_image:
+        if all_tokens_found:
             # Bonus for exact phrase match
             if query in title_text:
                 score += 50
             
             # Bonus for newer products
-            score += product.product_id * 0.01
+            score += product_id * 0.01
             
             # Bonus for special offers
-            if product.is_special or product.discount_price:
+            if is_promo:
                 score += 5
             
-            scored_products.append((score, product))
-            print(f"✓ Match: {product.product_name} (score: {score})")  # Debug
+            scored_products.append((score, product_id))
+            print(f"✓ Match: {title_text} (score: {score})")  # Debug
     
     print(f"📊 Total matches: {len(scored_products)}")  # Debug
     
-    # Sort by score (highest first)
+    # Sort by score (highest first) and return top 50
     scored_products.sort(key=lambda x: x[0], reverse=True)
+    return [product_id for _, product_id in scored_products[:50]]
+
+def snapshot_search_candidates(snapshot, tokens):
+    """Ids whose text contains every token (or a synonym) by trigram postings - a
+    superset of the matches. None when a term is too short to narrow by."""
+    candidates = None
+    for token in tokens:
+        token_ids = set()
+        for term in search_terms(token):
+            if len(term) < 3:
+                return None
+            term_ids = None
+            for gram in trigrams(term):
+                gram_ids = set(snapshot.ids(f'tri:{gram}'))
+                term_ids = gram_ids if term_ids is None else term_ids & gram_ids
+                if not term_ids:
+                    break
+            token_ids |= term_ids
+        candidates = token_ids if candidates is None else candidates & token_ids
+    return candidates
+
+def search_doc(product):
+    """rank_search fields of an ORM product"""
+    return (
+        product.product_id,
+        product.product_name.lower(),
+        (product.description or '').lower(),
+        (product.tags or '').lower(),
+        ' '.join([(spec.value or '').lower() for spec in product.specs]),
+        bool(product.main_image),
+        bool(product.is_special or product.discount_price)
+    )
+
+@app.route('/api/search')
+def api_search():
+    """Smart search with relevance scoring and synonym support"""
+    query = request.args.get('q', '').strip().lower()
+    if not query:
+        return jsonify([])
+    
+    # Tokenize and clean query - remove stop words
+    tokens = search_tokens(query)
+    
+    if not tokens:
+        return jsonify([])
+    
+    print(f"🔍 Search tokens after cleaning: {tokens}")  # Debug
+    
+    snapshot = catalog_snapshot()
+    if snapshot:
+        docs = snapshot.search_docs(snapshot_search_candidates(snapshot, tokens))
+        return snapshot_products_response(snapshot, rank_search(query, tokens, docs))
     
-    # Filter out products without images and return top 50
-    products_with_images = [(score, p) for score, p in scored_products if p.main_image]
+    # Get all products
+    all_products = Product.query.options(selectinload(Product.specs)).all()
+    ranked = rank_search(query, tokens, (search_doc(p) for p in all_products))
     
-    return jsonify([format_product(p[1]) for p in products_with_images[:50]])
+    products_by_id = {p.product_id: p for p in all_products}
+    return products_response(products_by_id[product_id] for product_id in ranked)
 
 # ---------------- IMAGE UPLOAD (Optional - for admin) ----------------
 @app.route('/api/upload-image', methods=['POST'])
@@ -827,14 +2622,13 @@ def upload_image():
     
     return jsonify({'error': 'Invalid file type'}), 400
 
-@app.route('/api/brands/<brand_name>/products')
-def api_brand_products(brand_name):
-    """Get all products for a specific brand - supports comma-separated brands"""
+def brand_products(brand_name):
+    """Products with an image whose brand spec lists brand_name - supports comma-separated brands"""
     # First, get the spec_type for 'E pershtatshme per'
     brand_spec_type = SpecType.query.filter_by(name='E pershtatshme per').first()
     
     if not brand_spec_type:
-        return jsonify([])
+        return []
     
     # Get all product specs with this type
     all_brand_specs = ProductSpec.query.filter_by(spectype_id=brand_spec_type.id).all()
@@ -852,13 +2646,19 @@ def api_brand_products(brand_name):
     product_ids = list(set(product_ids))
     
     # Get products that have images
-    products = Product.query.filter(
+    return Product.query.filter(
         Product.product_id.in_(product_ids),
         Product.main_image.isnot(None),
         Product.main_image != ''
     ).all()
-    
-    return jsonify([format_product(p) for p in products])
+
+@app.route('/api/brands/<brand_name>/products')
+def api_brand_products(brand_name):
+    """Get all products for a specific brand - supports comma-separated brands"""
+    snapshot = catalog_snapshot()
+    if snapshot:
+        return snapshot_products_response(snapshot, snapshot.ids(f'brand:{brand_name.lower()}'))
+    return products_response(brand_products(brand_name))
 
 @app.route('/api/auth/signup', methods=['POST'])
 def api_signup():
@@ -976,6 +2776,13 @@ def api_reset_password():
     
     return jsonify({'success': True, 'message': 'Password reset successful'}), 200
 
+@scheduled_job(timedelta(hours=12))
+def prune_password_resets():
+    """Delete used and expired password reset tokens"""
+    PasswordReset.query.filter(
+        (PasswordReset.used == True) | (PasswordReset.expires_at < datetime.utcnow())
+    ).delete(synchronize_session=False)
+
 # ---------------- ADMIN PANEL ----------------
 
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -1039,60 +2846,24 @@ def admin_panel():
 @app.route('/admin/products')
 @require_admin
 def admin_products():
-    """List all products"""
-    products = Product.query.order_by(Product.product_id.desc()).all()
-    
-    # Ensure products have subcategory relationship loaded
-    for product in products:
-        if not product.main_image:
-            product.main_image = '/static/uploads/default.png'
-    
-    return render_template('admin_products.html', products=products)
+    """Product management page - rows are fetched page by page from /api/admin/products"""
+    subcategories = db.session.query(
+        Subcategory.subcategory_id, Subcategory.subcategory_name, Category.category_name
+    ).join(Category).order_by(Category.category_name, Subcategory.sort_order).all()
+
+    return render_template('admin_products.html', subcategories=subcategories)
 
 @app.route('/admin/add-product')
 @require_admin
 def admin_add_product():
     """Add new product page"""
-    categories = Category.query.all()
-    
-    # Convert categories to JSON-serializable format
-    categories_data = []
-    for cat in categories:
-        categories_data.append({
-            'category_id': cat.category_id,
-            'category_name': cat.category_name,
-            'subcategories': [
-                {
-                    'subcategory_id': sub.subcategory_id,
-                    'subcategory_name': sub.subcategory_name
-                }
-                for sub in cat.subcategories
-            ]
-        })
-    
-    return render_template('admin_add_product.html', categories=categories_data)
+    return render_template('admin_add_product.html', categories=category_tree()['tree'])
 
 @app.route('/admin/edit-product/<int:product_id>')
 @require_admin
 def admin_edit_product(product_id):
     """Edit existing product page"""
     product = Product.query.get_or_404(product_id)
-    categories = Category.query.all()
-    
-    # Convert categories to JSON-serializable format
-    categories_data = []
-    for cat in categories:
-        categories_data.append({
-            'category_id': cat.category_id,
-            'category_name': cat.category_name,
-            'subcategories': [
-                {
-                    'subcategory_id': sub.subcategory_id,
-                    'subcategory_name': sub.subcategory_name
-                }
-                for sub in cat.subcategories
-            ]
-        })
     
     # Convert product to dict
     product_data = {
@@ -1118,10 +2889,99 @@ def admin_edit_product(product_id):
     }
     
     return render_template('admin_add_product.html', 
-                         categories=categories_data, 
+                         categories=category_tree()['tree'], 
                          product=product_data,
                          is_edit=True)
 
+def admin_product_filters():
+    """Filters for the admin product list from the request args
+
+    q (name, tag or product id), subcategory_id, stock (in_stock/sold_out),
+    special (1/0) and missing_image (1).
+    """
+    filters = []
+
+    q = request.args.get('q', '').strip().lstrip('#')
+    if q:
+        text_match = Product.product_name.ilike(f'%{q}%') | Product.tags.ilike(f'%{q}%')
+        if q.isdigit():
+            text_match = text_match | (Product.product_id == int(q))
+        filters.append(text_match)
+
+    subcategory_id = request.args.get('subcategory_id', type=int)
+    if subcategory_id:
+        filters.append(Product.subcategory_id == subcategory_id)
+
+    stock = request.args.get('stock')
+    if stock == 'in_stock':
+        filters.append(db.or_(Product.sold_out == False, Product.sold_out.is_(None)))
+    elif stock == 'sold_out':
+        filters.append(Product.sold_out == True)
+    elif stock:
+        raise ValueError('stock must be in_stock or sold_out')
+
+    special = request.args.get('special')
+    if special:
+        if parse_flag(special):
+            filters.append(Product.is_special == True)
+        else:
+            filters.append(db.or_(Product.is_special == False, Product.is_special.is_(None)))
+
+    if parse_flag(request.args.get('missing_image')):
+        filters.append(db.or_(Product.main_image.is_(None), Product.main_image == ''))
+
+    return filters
+
+@app.route('/api/admin/products', methods=['GET'])
+@require_admin
+def api_admin_products():
+    """Get a page of products for the admin list, newest first
+
+    Query args: see admin_product_filters, plus limit and cursor
+    (next_cursor of the previous page). Only the listed columns are loaded.
+    """
+    try:
+        limit = parse_limit()
+        filters = admin_product_filters()
+
+        query = db.session.query(
+            Product.product_id, Product.product_name, Product.price, Product.discount_price,
+            Product.is_special, Product.sold_out, Product.main_image, Subcategory.subcategory_name
+        ).outerjoin(Subcategory, Product.subcategory_id == Subcategory.subcategory_id).filter(*filters)
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            (product_id,) = decode_cursor(cursor)
+            query = query.filter(Product.product_id < product_id)
+
+        rows = query.order_by(Product.product_id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        result = {
+            'success': True,
+            'products': [{
+                'product_id': row.product_id,
+                'product_name': row.product_name,
+                'price': row.price,
+                'discount_price': row.discount_price,
+                'is_special': bool(row.is_special),
+                'sold_out': bool(row.sold_out),
+                'main_image': row.main_image or '',
+                'subcategory_name': row.subcategory_name
+            } for row in rows],
+            'next_cursor': encode_cursor(rows[-1].product_id) if has_more else None
+        }
+
+        # Result count, only needed with the first page
+        if not cursor:
+            result['total'] = db.session.query(db.func.count(Product.product_id)).filter(*filters).scalar()
+
+        return jsonify(result)
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @app.route('/api/admin/product', methods=['POST'])
 @require_admin
 def api_admin_create_product():
@@ -1157,9 +3017,8 @@ def api_admin_create_product():
                     )
                     db.session.add(spec)
         
+        catalog_changed()
         db.session.commit()
-
-        ping_google_sitemap()  # Notify Google
         
         return jsonify({
             'success': True,
@@ -1171,44 +3030,80 @@ def api_admin_create_product():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def sync_product_specs(product, spec_values):
+    """Bring product.specs in line with {spectype_id: value} using only the needed writes
+
+    Returns {'added': [...], 'updated': [...], 'removed': [...]} spectype ids.
+    """
+    diff = {'added': [], 'updated': [], 'removed': []}
+    existing = {}
+    for spec in list(product.specs):
+        if spec.spectype_id in existing or spec.spectype_id not in spec_values:
+            product.specs.remove(spec)  # Duplicate or no longer wanted - delete-orphan
+            if spec.spectype_id not in spec_values and spec.spectype_id not in diff['removed']:
+                diff['removed'].append(spec.spectype_id)
+            continue
+        existing[spec.spectype_id] = spec
+
+    for spectype_id, value in spec_values.items():
+        spec = existing.get(spectype_id)
+        if spec is None:
+            product.specs.append(ProductSpec(spectype_id=spectype_id, value=value))
+            diff['added'].append(spectype_id)
+        elif spec.value != value:
+            spec.value = value
+            diff['updated'].append(spectype_id)
+    return diff
+
 @app.route('/api/admin/product/<int:product_id>', methods=['PUT'])
 @require_admin
 def api_admin_update_product(product_id):
-    """Update existing product"""
+    """Update existing product, writing only what changed
+
+    The response lists changed_fields and spec_changes, and the catalog
+    caches are only invalidated when something actually changed.
+    """
     try:
         product = Product.query.get_or_404(product_id)
         data = request.json
         
         # Update basic fields
-        product.product_name = data['name']
-        product.description = data.get('description')
-        product.price = float(data['price'])
-        product.discount_price = float(data['discount_price']) if data.get('discount_price') else None
-        product.is_special = data.get('is_special', False)
-        product.sold_out = data.get('sold_out', False)
-        product.subcategory_id = int(data['subcategory_id'])
-        product.main_image = data.get('main_image')
-        product.image_urls = data.get('image_urls')
-        product.tags = data.get('tags')
-        
-        # Update specs - delete old ones and add new
-        ProductSpec.query.filter_by(product_id=product_id).delete()
+        new_values = {
+            'product_name': data['name'],
+            'description': data.get('description'),
+            'price': float(data['price']),
+            'discount_price': float(data['discount_price']) if data.get('discount_price') else None,
+            'is_special': data.get('is_special', False),
+            'sold_out': data.get('sold_out', False),
+            'subcategory_id': int(data['subcategory_id']),
+            'main_image': data.get('main_image'),
+            'image_urls': data.get('image_urls'),
+            'tags': data.get('tags')
+        }
+        changed_fields = []
+        for field, value in new_values.items():
+            if getattr(product, field) != value:
+                setattr(product, field, value)
+                changed_fields.append(field)
         
-        if data.get('specs'):
-            for spec_data in data['specs']:
-                if spec_data.get('value'):
-                    spec = ProductSpec(
-                        product_id=product_id,
-                        spectype_id=int(spec_data['spectype_id']),
-                        value=spec_data['value']
-                    )
-                    db.session.add(spec)
+        # Update specs - diff against the existing rows
+        spec_values = {}
+        for spec_data in data.get('specs') or []:
+            if spec_data.get('value'):
+                spec_values[int(spec_data['spectype_id'])] = spec_data['value']
+        spec_changes = sync_product_specs(product, spec_values)
+        if any(spec_changes.values()):
+            changed_fields.append('specs')
         
+        if changed_fields:
+            catalog_changed()
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': 'Product updated successfully'
+            'message': 'Product updated successfully' if changed_fields else 'No changes',
+            'changed_fields': changed_fields,
+            'spec_changes': spec_changes
         }), 200
         
     except Exception as e:
@@ -1222,6 +3117,7 @@ def api_admin_delete_product(product_id):
     try:
         product = Product.query.get_or_404(product_id)
         db.session.delete(product)
+        catalog_changed()
         db.session.commit()
         
         return jsonify({
@@ -1260,6 +3156,311 @@ def api_admin_subcategory_specs(subcategory_id):
         })
     return jsonify(specs)
 
+# ---------------- BULK IMPORT ----------------
+# Rows are dicts with the product fields below, a subcategory (id or name)
+# and specs as {"Spec name": value} or CSV columns named "spec:<Spec name>".
+# A row with an "id" updates that product: only the fields the row has are
+# written - a missing key, null or blank CSV cell leaves the field as it is -
+# and its specs are replaced when the row has any. Valid rows are written in
+# one transaction; invalid rows are reported by row number and skipped.
+IMPORT_CHUNK_SIZE = 500
+IMPORT_TRUE_VALUES = ('1', 'true', 'yes', 'po', 'y')
+
+class ImportRowError(Exception):
+    pass
+
+def parse_import_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in IMPORT_TRUE_VALUES
+
+def parse_import_price(value, field, required=False):
+    if value is None or str(value).strip() == '':
+        if required:
+            raise ImportRowError(f'{field} is required')
+        return None
+    try:
+        price = float(str(value).replace(',', '.'))
+    except ValueError:
+        raise ImportRowError(f'{field} is not a number')
+    if price < 0:
+        raise ImportRowError(f'{field} must not be negative')
+    return price
+
+def read_import_rows(raw, filename=''):
+    """Rows from uploaded CSV text or a JSON list ({"products": [...]} also accepted)"""
+    if filename.lower().endswith('.json') or raw.lstrip().startswith(('[', '{')):
+        data = json.loads(raw)
+        return data.get('products', []) if isinstance(data, dict) else data
+
+    rows = []
+    for row in csv.DictReader(io.StringIO(raw)):
+        specs = {key[5:].strip(): value for key, value in row.items() if key and key.lower().startswith('spec:')}
+        row = {key.strip().lower(): value for key, value in row.items() if key and not key.lower().startswith('spec:')}
+        row['specs'] = specs
+        rows.append(row)
+    return rows
+
+def import_products(rows, dry_run=False):
+    """Validate and write product rows. Returns {'created', 'updated', 'errors'}."""
+    # Resolve names in bulk: all subcategories, spec types and their links up front
+    subcategories = Subcategory.query.options(load_only(Subcategory.subcategory_id, Subcategory.subcategory_name)).all()
+    subcategory_ids = {sub.subcategory_id for sub in subcategories}
+    subcategories_by_name = {}
+    for sub in subcategories:
+        subcategories_by_name.setdefault(sub.subcategory_name.strip().lower(), []).append(sub.subcategory_id)
+
+    spec_types_by_name = {}
+    for spec_type in SpecType.query.options(load_only(SpecType.id, SpecType.name)).all():
+        spec_types_by_name.setdefault(spec_type.name.strip().lower(), []).append(spec_type.id)
+    linked_spec_types = set(db.session.execute(
+        db.select(subcategory_spectype.c.subcategory_id, subcategory_spectype.c.spectype_id)
+    ).all())
+
+    update_ids = set()
+    for row in rows:
+        if isinstance(row, dict) and str(row.get('id') or '').strip().isdigit():
+            update_ids.add(int(row['id']))
+    existing_subcategories = dict(db.session.query(Product.product_id, Product.subcategory_id).filter(
+        Product.product_id.in_(update_ids)
+    )) if update_ids else {}
+
+    def resolve_subcategory(value):
+        value = str(value or '').strip()
+        if value.isdigit() and int(value) in subcategory_ids:
+            return int(value)
+        matches = subcategories_by_name.get(value.lower(), [])
+        if len(matches) != 1:
+            raise ImportRowError(f'Unknown subcategory "{value}"' if not matches else f'Ambiguous subcategory "{value}"')
+        return matches[0]
+
+    def resolve_spec_type(name, subcategory_id):
+        matches = spec_types_by_name.get(name.strip().lower(), [])
+        if not matches:
+            raise ImportRowError(f'Unknown spec "{name}"')
+        # Prefer the spec type attached to the product's subcategory
+        linked = [st for st in matches if (subcategory_id, st) in linked_spec_types]
+        return (linked or matches)[0]
+
+    def row_values(row, partial):
+        """Product columns of a row - for updates (partial) only the fields it has"""
+        def given(*keys):
+            # csv.DictReader gives '' for a blank cell, so blank counts as absent
+            return next((key for key in keys if row.get(key) is not None and str(row.get(key)).strip() != ''), None)
+
+        values = {}
+        key = given('name', 'product_name')
+        if key or not partial:
+            name = str(row.get(key) or '').strip()
+            if not name:
+                raise ImportRowError('name is required')
+            values['product_name'] = name[:150]
+        if given('price') or not partial:
+            values['price'] = parse_import_price(row.get('price'), 'price', required=True)
+        if given('discount_price') or not partial:
+            values['discount_price'] = parse_import_price(row.get('discount_price'), 'discount_price')
+        key = given('subcategory', 'subcategory_id')
+        if key or not partial:
+            values['subcategory_id'] = resolve_subcategory(row.get(key))
+        for field in ('is_special', 'sold_out'):
+            if given(field) or not partial:
+                values[field] = parse_import_bool(row.get(field))
+        for field in ('description', 'main_image', 'image_urls', 'tags'):
+            if given(field) or not partial:
+                values[field] = row.get(field) or None
+        return values
+
+    creates, updates, errors = [], [], []
+    for number, row in enumerate(rows, 1):
+        try:
+            if not isinstance(row, dict):
+                raise ImportRowError('Row is not an object')
+            product_id = str(row.get('id') or '').strip()
+            if product_id and (not product_id.isdigit() or int(product_id) not in existing_subcategories):
+                raise ImportRowError(f'Unknown product id {product_id}')
+
+            values = row_values(row, partial=bool(product_id))
+            subcategory_id = values.get('subcategory_id') or existing_subcategories.get(int(product_id or 0))
+            specs = [
+                (resolve_spec_type(spec_name, subcategory_id), str(value).strip())
+                for spec_name, value in (row.get('specs') or {}).items()
+                if value is not None and str(value).strip()
+            ]
+
+            if product_id:
+                updates.append(({'product_id': int(product_id), **values}, specs))
+            else:
+                creates.append((values, specs))
+        except ImportRowError as e:
+            errors.append({'row': number, 'error': str(e)})
+
+    result = {'created': len(creates), 'updated': len(updates), 'errors': errors, 'dry_run': dry_run}
+    if dry_run or not (creates or updates):
+        return result
+
+    spec_rows = []
+    for i in range(0, len(creates), IMPORT_CHUNK_SIZE):
+        chunk = [(Product(**values), specs) for values, specs in creates[i:i + IMPORT_CHUNK_SIZE]]
+        db.session.add_all([product for product, _ in chunk])
+        db.session.flush()  # Batched INSERTs; assigns product ids
+        for product, specs in chunk:
+            spec_rows.extend({'product_id': product.product_id, 'spectype_id': st, 'value': v} for st, v in specs)
+        for product, _ in chunk:
+            db.session.expunge(product)  # Don't let the identity map grow with the import
+
+    for i in range(0, len(updates), IMPORT_CHUNK_SIZE):
+        chunk = updates[i:i + IMPORT_CHUNK_SIZE]
+        by_columns = {}  # One executemany per set of columns, so rows only write the fields they have
+        for values, _ in chunk:
+            if len(values) > 1:
+                by_columns.setdefault(tuple(sorted(values)), []).append(values)
+        for batch in by_columns.values():
+            db.session.execute(db.update(Product), batch)  # executemany by primary key
+        replaced = [values['product_id'] for values, specs in chunk if specs]
+        if replaced:
+            ProductSpec.query.filter(ProductSpec.product_id.in_(replaced)).delete(synchronize_session=False)
+        for values, specs in chunk:
+            spec_rows.extend({'product_id': values['product_id'], 'spectype_id': st, 'value': v} for st, v in specs)
+
+    for i in range(0, len(spec_rows), IMPORT_CHUNK_SIZE):
+        db.session.execute(db.insert(ProductSpec), spec_rows[i:i + IMPORT_CHUNK_SIZE])
+
+    catalog_changed()  # Once for the whole import
+    db.session.commit()
+    return result
+
+@app.route('/api/admin/products/import', methods=['POST'])
+@require_admin
+def api_admin_import_products():
+    """Bulk create/update products from an uploaded CSV/JSON file or a JSON body. ?dry_run=1 only validates."""
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            rows = read_import_rows(upload.read().decode('utf-8-sig'), upload.filename or '')
+        else:
+            data = request.get_json(silent=True)
+            rows = data.get('products', []) if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            return jsonify({'success': False, 'error': 'Expected a list of products'}), 400
+
+        result = import_products(rows, dry_run=parse_flag(request.args.get('dry_run')))
+        return jsonify({'success': True, **result}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate only')
+def import_products_command(path, dry_run):
+    """Bulk create/update products from a CSV or JSON file"""
+    with open(path, encoding='utf-8-sig') as f:
+        rows = read_import_rows(f.read(), path)
+    result = import_products(rows, dry_run=dry_run)
+    for error in result['errors']:
+        print(f"❌ Row {error['row']}: {error['error']}")
+    print(f"✅ {'Would create' if dry_run else 'Created'} {result['created']}, "
+          f"{'would update' if dry_run else 'updated'} {result['updated']}, {len(result['errors'])} rows with errors")
+
+# ---------------- BULK OPERATIONS ----------------
+BRAND_SPEC_NAME = 'E pershtatshme per'
+BULK_ACTIONS = ('set_discount_percent', 'adjust_discount_percent', 'set_sold_out', 'toggle_sold_out', 'set_is_special')
+
+def like_escape(value):
+    """value with LIKE wildcards escaped - use with escape='/'"""
+    return value.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+def comma_list_contains(column, item):
+    """SQL condition: the comma-separated column has item as a whole entry
+    (case-insensitive, whitespace around entries ignored, like a Python
+    [v.strip() for v in value.split(',')])"""
+    # " BMW ,  Audi" -> ",bmw,audi," LIKE "%,bmw,%"
+    value = db.func.lower(column)
+    for whitespace in ('\t', '\r', '\n'):
+        value = db.func.replace(value, whitespace, ' ')
+    for _ in range(4):  # Runs of up to 16 spaces
+        value = db.func.replace(value, '  ', ' ')
+    value = db.func.replace(db.func.replace(value, ' ,', ','), ', ', ',')
+    padded = db.literal(',') + db.func.trim(value) + db.literal(',')
+    item = ' '.join(item.split()).lower()
+    return padded.like(f'%,{like_escape(item)},%', escape='/')
+
+def brand_product_ids(brand_name):
+    """Subquery of product ids whose brand spec lists brand_name (exact, case-insensitive)"""
+    return db.select(ProductSpec.product_id).join(SpecType, SpecType.id == ProductSpec.spectype_id).where(
+        SpecType.name == BRAND_SPEC_NAME,
+        comma_list_contains(ProductSpec.value, brand_name)
+    )
+
+def bulk_product_filters(spec):
+    """SQL filters from {subcategory_ids, brand, tag, product_ids}"""
+    filters = []
+    if spec.get('subcategory_ids'):
+        filters.append(Product.subcategory_id.in_([int(i) for i in spec['subcategory_ids']]))
+    if spec.get('product_ids'):
+        filters.append(Product.product_id.in_([int(i) for i in spec['product_ids']]))
+    if spec.get('brand'):
+        filters.append(Product.product_id.in_(brand_product_ids(spec['brand'])))
+    if spec.get('tag'):
+        filters.append(comma_list_contains(Product.tags, spec['tag']))
+    return filters
+
+def bulk_update_values(action, value):
+    """Column -> SQL expression for one UPDATE statement"""
+    if action == 'set_discount_percent':
+        percent = float(value)
+        if not 0 <= percent < 100:
+            raise ValueError('Discount percent must be between 0 and 100')
+        return {'discount_price': db.func.round(Product.price * (1 - percent / 100)) if percent else None}
+
+    if action == 'adjust_discount_percent':
+        # Current percent off (0 without a discount) plus the adjustment, kept within 0..95
+        current = (1 - db.func.coalesce(Product.discount_price, Product.price) / Product.price) * 100
+        new_percent = current + float(value)
+        return {'discount_price': db.case(
+            (new_percent <= 0, None),
+            (new_percent >= 95, db.func.round(Product.price * 0.05)),
+            else_=db.func.round(Product.price * (1 - new_percent / 100))
+        )}
+
+    if action == 'set_sold_out':
+        return {'sold_out': parse_flag(value)}
+    if action == 'toggle_sold_out':
+        return {'sold_out': db.not_(Product.sold_out)}
+    if action == 'set_is_special':
+        return {'is_special': parse_flag(value)}
+    raise ValueError(f"Unknown action. Choose from: {', '.join(BULK_ACTIONS)}")
+
+@app.route('/api/admin/products/bulk', methods=['POST'])
+@require_admin
+def api_admin_bulk_products():
+    """Apply one action to every product matching a filter, as a single UPDATE
+
+    Body: {"filter": {"subcategory_ids": [...], "brand": "BMW", "tag": "...",
+    "product_ids": [...]}, "action": "...", "value": ..., "dry_run": true}
+    """
+    try:
+        data = request.json or {}
+        filters = bulk_product_filters(data.get('filter') or {})
+        if not filters:
+            return jsonify({'success': False, 'error': 'A filter is required'}), 400
+        values = bulk_update_values(data.get('action'), data.get('value'))
+        if 'discount_price' in values:
+            filters.append(Product.price > 0)
+
+        if parse_flag(data.get('dry_run')):
+            matched = db.session.query(db.func.count(Product.product_id)).filter(*filters).scalar()
+            return jsonify({'success': True, 'dry_run': True, 'matched': matched}), 200
+
+        updated = Product.query.filter(*filters).update(values, synchronize_session=False)
+        if updated:
+            catalog_changed()
+        db.session.commit()
+        return jsonify({'success': True, 'updated': updated}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 def send_order_notification_email(order, cart_items):
     """Send email notification when new order is placed"""
     if not MAIL_ENABLED or mail is None:
@@ -1492,19 +3693,126 @@ def send_customer_confirmation_email(order, cart_items, customer_email):
     except Exception as e:
         print(f"❌ Failed to send customer email: {e}")
 
+# Flat shipping per country in ALL (same as the checkout form in index.html)
+SHIPPING_COSTS = {'Albania': 300, 'Kosovo': 700}
+
+class CartError(Exception):
+    """A cart that can't be ordered as sent"""
+    def __init__(self, message, product_ids=None):
+        super().__init__(message)
+        self.product_ids = product_ids or []
+
+def price_cart(cart_items):
+    """Resolve cart lines against the catalog in one query
+
+    Returns lines with server-side names and prices (discount_price when
+    lower than price). Raises CartError for empty carts, bad quantities,
+    unknown products and sold out products.
+    """
+    quantities = {}
+    for item in cart_items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise CartError('Invalid cart item')
+        if quantity < 1:
+            raise CartError('Invalid quantity', [product_id])
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    if not quantities:
+        raise CartError('Cart is empty')
+
+    products = {
+        p.product_id: p for p in Product.query.options(
+            load_only(Product.product_id, Product.product_name, Product.price,
+                      Product.discount_price, Product.sold_out, Product.main_image)
+        ).filter(Product.product_id.in_(quantities)).all()
+    }
+
+    missing = [pid for pid in quantities if pid not in products]
+    if missing:
+        raise CartError('Some products no longer exist', missing)
+    sold_out = [pid for pid in quantities if products[pid].sold_out]
+    if sold_out:
+        raise CartError('Some products are sold out', sold_out)
+
+    lines = []
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        price = product.price
+        if product.discount_price and product.discount_price < product.price:
+            price = product.discount_price
+        lines.append({
+            'product_id': product_id,
+            'name': product.product_name,
+            'price': price,
+            'quantity': quantity,
+            'image': product.main_image
+        })
+    return lines
+
+# Retries with the same Idempotency-Key within this window return the original order
+IDEMPOTENCY_TTL = timedelta(hours=env_int('IDEMPOTENCY_TTL_HOURS', 24))
+
+def find_idempotent_order(key, request_hash):
+    """Response for a repeated order request, or None if the key is new (or expired)"""
+    existing = db.session.get(IdempotencyKey, key)
+    if not existing:
+        return None
+    if existing.created_at < datetime.utcnow() - IDEMPOTENCY_TTL:
+        db.session.delete(existing)
+        db.session.commit()
+        return None
+    if existing.request_hash != request_hash:
+        return jsonify({'success': False, 'error': 'Idempotency-Key was already used for a different order'}), 422
+    return jsonify({
+        'success': True,
+        'order_id': existing.order_id,
+        'message': 'Order already placed',
+        'duplicate': True
+    }), 200
+
+@scheduled_job(timedelta(hours=1))
+def prune_idempotency_keys():
+    """Delete idempotency keys past their TTL"""
+    IdempotencyKey.query.filter(
+        IdempotencyKey.created_at < datetime.utcnow() - IDEMPOTENCY_TTL
+    ).delete(synchronize_session=False)
+
 @app.route('/api/order', methods=['POST'])
 def create_order():
-    """Save customer order"""
+    """Save customer order
+
+    Send an Idempotency-Key header to make retries safe: a repeat with the
+    same key and body returns the first order's id without creating a new
+    order or sending emails again.
+    """
     try:
         data = request.json
         
         if not data or not data.get('customer_name') or not data.get('customer_phone'):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        # Calculate totals
-        cart_items = data.get('cart_items', [])
+        idempotency_key = (request.headers.get('Idempotency-Key') or '').strip()[:100]
+        request_hash = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        if idempotency_key:
+            repeated = find_idempotent_order(idempotency_key, request_hash)
+            if repeated:
+                return repeated
+        
+        # Price the cart from the catalog, never from client-sent prices
+        try:
+            cart_items = price_cart(data.get('cart_items', []))
+        except CartError as e:
+            return jsonify({'success': False, 'error': str(e), 'product_ids': e.product_ids}), 400
+        
+        # Shipping from the country too - a client-sent shipping_cost is ignored
+        shipping_cost = SHIPPING_COSTS.get(data.get('customer_country'))
+        if shipping_cost is None:
+            return jsonify({'success': False, 'error': 'We only ship to Albania and Kosovo'}), 400
+        
         subtotal = sum(item['price'] * item['quantity'] for item in cart_items)
-        shipping_cost = data.get('shipping_cost', 0)
         total = subtotal + shipping_cost
         
         # Get user_id if email provided
@@ -1531,7 +3839,34 @@ def create_order():
         )
         
         db.session.add(order)
-        db.session.commit()
+        db.session.flush()  # Get the order_id
+        
+        # Line items in one executemany, same transaction as the order
+        db.session.execute(db.insert(OrderItem), [
+            {
+                'order_id': order.order_id,
+                'product_id': item['product_id'],
+                'product_name': item['name'],
+                'unit_price': item['price'],
+                'quantity': item['quantity'],
+                'line_total': item['price'] * item['quantity']
+            } for item in cart_items
+        ])
+        if idempotency_key:
+            db.session.add(IdempotencyKey(key=idempotency_key, request_hash=request_hash, order_id=order.order_id))
+        apply_sales_deltas(order_sales_deltas(
+            order, [(item['product_id'], item['quantity'], item['price'] * item['quantity']) for item in cart_items]
+        ))
+        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent retry with the same key won the race
+            db.session.rollback()
+            repeated = find_idempotent_order(idempotency_key, request_hash) if idempotency_key else None
+            if repeated:
+                return repeated
+            raise
         
         print(f"✅ Order #{order.order_id} created successfully")
         
@@ -1542,11 +3877,11 @@ def create_order():
                 admin_msg = create_admin_notification_email(order, cart_items)
                 
                 # Send in background thread
-                Thread(target=send_async_email, args=(app, admin_msg)).start()
+                queue_email(admin_msg)
                 
                 if customer_email:
                     customer_msg = create_customer_confirmation_email(order, cart_items, customer_email)
-                    Thread(target=send_async_email, args=(app, customer_msg)).start()
+                    queue_email(customer_msg)
                 
                 print("📧 Emails queued for sending")
             except Exception as e:
@@ -1565,7 +3900,11 @@ def create_order():
     
 @app.route('/api/user/orders', methods=['POST'])
 def get_user_orders():
-    """Get orders for a specific user by email"""
+    """Get a page of orders for a specific user by email, newest first
+
+    Body: email, limit, cursor (next_cursor of the previous page). Responds
+    304 when If-None-Match matches, i.e. no order or status change since.
+    """
     try:
         data = request.json
         email = data.get('email')
@@ -1573,20 +3912,42 @@ def get_user_orders():
         if not email:
             return jsonify({'success': False, 'error': 'Email required'}), 400
         
-        # Get user
-        user = User.query.filter_by(email=email).first()
+        limit = max(1, min(int(data.get('limit') or 50), 200))
+        cursor = data.get('cursor')
         
-        if not user:
+        # Get user together with what the ETag depends on, in one query
+        summary = db.session.query(
+            User.user_id,
+            db.func.count(db.distinct(Order.order_id)),
+            db.func.max(Order.created_at),
+            db.func.max(OrderStatusHistory.created_at)
+        ).outerjoin(Order, Order.user_id == User.user_id).outerjoin(
+            OrderStatusHistory, OrderStatusHistory.order_id == Order.order_id
+        ).filter(User.email == email).group_by(User.user_id).first()
+        
+        if not summary:
             return jsonify({'success': False, 'orders': []}), 200
         
-        # Get all orders for this user
-        orders = Order.query.filter_by(user_id=user.user_id).order_by(Order.created_at.desc()).all()
+        user_id, order_count, last_order_at, last_status_at = summary
+        etag = hashlib.md5(f'{user_id}:{order_count}:{last_order_at}:{last_status_at}:{cursor}:{limit}'.encode()).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            return '', 304
+        
+        # Orders, then all their status histories in a single IN query
+        query = Order.query.options(selectinload(Order.status_history)).filter(Order.user_id == user_id)
+        if cursor:
+            created_at, order_id = decode_cursor(cursor)
+            created_at = datetime.fromisoformat(created_at)
+            query = query.filter(
+                (Order.created_at < created_at) |
+                ((Order.created_at == created_at) & (Order.order_id < order_id))
+            )
+        orders = query.order_by(Order.created_at.desc(), Order.order_id.desc()).limit(limit + 1).all()
+        has_more = len(orders) > limit
+        orders = orders[:limit]
         
         orders_list = []
         for order in orders:
-            # Get status history
-            history = OrderStatusHistory.query.filter_by(order_id=order.order_id).order_by(OrderStatusHistory.created_at.asc()).all()
-            
             orders_list.append({
                 'order_id': order.order_id,
                 'customer_name': order.customer_name,
@@ -1605,51 +3966,371 @@ def get_user_orders():
                         'status': h.status,
                         'notes': h.notes,
                         'created_at': h.created_at.strftime('%Y-%m-%d %H:%M')
-                    } for h in history
+                    } for h in order.status_history
                 ]
             })
         
-        return jsonify({'success': True, 'orders': orders_list}), 200
+        response = jsonify({
+            'success': True,
+            'orders': orders_list,
+            'next_cursor': encode_cursor(orders[-1].created_at, orders[-1].order_id) if has_more else None
+        })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
         
     except Exception as e:
         print(f"❌ Get user orders error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def order_summary(order):
+    """Admin list fields of an order - everything except the decoded items"""
+    return {
+        'order_id': order.order_id,
+        'customer_name': order.customer_name,
+        'customer_phone': order.customer_phone,
+        'customer_address': order.customer_address,
+        'customer_city': order.customer_city,
+        'customer_country': order.customer_country,
+        'total_amount': order.total_amount,
+        'shipping_cost': order.shipping_cost,
+        'status': order.status,
+        'created_at': order.created_at.strftime('%Y-%m-%d %H:%M'),
+        'notes': order.notes
+    }
+
+def admin_order_filters():
+    """Date-range and free-text filters from the request args (status is applied separately)"""
+    filters = []
+
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    if date_from:
+        filters.append(Order.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+    if date_to:
+        filters.append(Order.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+
+    q = request.args.get('q', '').strip().lstrip('#')
+    if q:
+        text_match = Order.customer_name.ilike(f'%{q}%') | Order.customer_phone.like(f'%{q}%')
+        if q.isdigit():
+            text_match = text_match | (Order.order_id == int(q))
+        filters.append(text_match)
+
+    return filters
+
 @app.route('/api/admin/orders', methods=['GET'])
 @require_admin
 def get_orders():
-    """Get all orders for admin"""
+    """Get a page of orders for admin, newest first
+
+    Query args: status, q (name, phone or order id), date_from/date_to
+    (YYYY-MM-DD, inclusive), limit, cursor (next_cursor of the previous page).
+    Order items aren't decoded here - see /api/admin/order/<id>.
+    """
     try:
         status = request.args.get('status', None)
-        
+        limit = parse_limit()
+        filters = admin_order_filters()
+
+        query = Order.query.options(defer(Order.order_items)).filter(*filters)
         if status:
-            orders = Order.query.filter_by(status=status).order_by(Order.created_at.desc()).all()
-        else:
-            orders = Order.query.order_by(Order.created_at.desc()).all()
-        
-        orders_list = []
-        for order in orders:
-            orders_list.append({
-                'order_id': order.order_id,
-                'customer_name': order.customer_name,
-                'customer_phone': order.customer_phone,
-                'customer_address': order.customer_address,
-                'customer_city': order.customer_city,
-                'customer_country': order.customer_country,
-                'total_amount': order.total_amount,
-                'shipping_cost': order.shipping_cost,
-                'status': order.status,
-                'order_items': json.loads(order.order_items),
-                'created_at': order.created_at.strftime('%Y-%m-%d %H:%M'),
-                'notes': order.notes
-            })
-        
-        return jsonify(orders_list), 200
+            query = query.filter(Order.status == status)
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            created_at, order_id = decode_cursor(cursor)
+            created_at = datetime.fromisoformat(created_at)
+            query = query.filter(
+                (Order.created_at < created_at) |
+                ((Order.created_at == created_at) & (Order.order_id < order_id))
+            )
+
+        orders = query.order_by(Order.created_at.desc(), Order.order_id.desc()).limit(limit + 1).all()
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+
+        result = {
+            'success': True,
+            'orders': [order_summary(order) for order in orders],
+            'next_cursor': encode_cursor(orders[-1].created_at, orders[-1].order_id) if has_more else None
+        }
+
+        # Tab badge counts, only needed with the first page
+        if not cursor:
+            counts = db.session.query(Order.status, db.func.count(Order.order_id)).filter(*filters).group_by(Order.status).all()
+            result['status_counts'] = {row_status: count for row_status, count in counts}
+
+        return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"❌ Get orders error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/admin/order/<int:order_id>', methods=['GET'])
+@require_admin
+def get_order(order_id):
+    """Get a single order with its items, for expanding it in the admin list"""
+    order = Order.query.get_or_404(order_id)
+    result = order_summary(order)
+    result['order_items'] = json.loads(order.order_items)
+    result['status_history'] = [
+        {
+            'status': h.status,
+            'notes': h.notes,
+            'created_at': h.created_at.strftime('%Y-%m-%d %H:%M')
+        } for h in order.status_history
+    ]
+    return jsonify(result), 200
+
+# ---------------- ANALYTICS ----------------
+# sales_aggregate holds per-day sums by order status, city and product. It's
+# adjusted in the same transaction as every order create, status change and
+# delete, so the dashboard reads a few hundred rows instead of all orders.
+# City and product rows only count orders in a revenue status.
+EXCLUDED_REVENUE_STATUSES = ('cancelled', 'failed_to_deliver')
+
+def order_sales_deltas(order, items, sign=1, status=None):
+    """Aggregate changes for adding (sign=1) or removing (sign=-1) an order
+    with its current status (or `status`)
+
+    items are (product_id, quantity, line_total) tuples.
+    """
+    day = order.created_at.date()
+    total = sign * order.total_amount
+    status = status or order.status or 'pending'
+    deltas = [(day, 'status', status, sign, 0, total)]
+    if status in EXCLUDED_REVENUE_STATUSES:
+        return deltas
+
+    deltas.append((day, 'city', (order.customer_city or '')[:100], sign, 0, total))
+    for product_id, quantity, line_total in items:
+        if product_id is not None:
+            deltas.append((day, 'product', str(product_id), sign, sign * quantity, sign * line_total))
+    return deltas
+
+def apply_sales_deltas(deltas, conn=None):
+    """Add deltas to sales_aggregate with one upsert (MySQL or SQLite)"""
+    merged = {}
+    for day, dimension, dim_key, orders, quantity, revenue in deltas:
+        row = merged.setdefault((day, dimension, dim_key), [0, 0, 0.0])
+        row[0] += orders
+        row[1] += quantity
+        row[2] += revenue
+    if not merged:
+        return
+
+    table = SalesAggregate.__table__
+    rows = [
+        {'day': day, 'dimension': dimension, 'dim_key': dim_key, 'orders': orders, 'quantity': quantity, 'revenue': revenue}
+        for (day, dimension, dim_key), (orders, quantity, revenue) in merged.items()
+    ]
+    executor = conn if conn is not None else db.session
+    dialect = conn.dialect.name if conn is not None else db.engine.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            orders=table.c.orders + stmt.inserted.orders,
+            quantity=table.c.quantity + stmt.inserted.quantity,
+            revenue=table.c.revenue + stmt.inserted.revenue
+        )
+    else:
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.dimension, table.c.dim_key],
+            set_={
+                'orders': table.c.orders + stmt.excluded.orders,
+                'quantity': table.c.quantity + stmt.excluded.quantity,
+                'revenue': table.c.revenue + stmt.excluded.revenue
+            }
+        )
+    executor.execute(stmt, rows)
+
+def rebuild_sales_aggregates(conn):
+    """Recompute sales_aggregate from orders and order items"""
+    conn.execute(SalesAggregate.__table__.delete())
+
+    orders = conn.execute(db.select(
+        Order.order_id, Order.created_at, Order.status, Order.customer_city, Order.total_amount
+    ).execution_options(yield_per=1000))
+    items = {}
+    for order_id, product_id, quantity, line_total in conn.execute(
+            db.select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.line_total)):
+        items.setdefault(order_id, []).append((product_id, quantity, line_total))
+
+    deltas = []
+    for order in orders:
+        deltas.extend(order_sales_deltas(order, items.get(order.order_id, [])))
+    apply_sales_deltas(deltas, conn)
+
+@app.cli.command('rebuild-analytics')
+def rebuild_analytics_command():
+    """Recompute the sales aggregates from scratch"""
+    with db.engine.begin() as conn:
+        rebuild_sales_aggregates(conn)
+    print("✅ Sales aggregates rebuilt")
+
+@app.route('/api/admin/analytics')
+@require_admin
+def admin_analytics():
+    """Dashboard numbers for the last ?days= days (default 30)"""
+    days = max(1, min(request.args.get('days', 30, type=int), 366))
+    since = date.today() - timedelta(days=days - 1)
+    in_range = (SalesAggregate.day >= since,)
+
+    def totals(dimension, order_by, limit=None):
+        orders = db.func.sum(SalesAggregate.orders)
+        revenue = db.func.sum(SalesAggregate.revenue)
+        quantity = db.func.sum(SalesAggregate.quantity)
+        query = db.session.query(SalesAggregate.dim_key, orders, quantity, revenue).filter(
+            SalesAggregate.dimension == dimension, *in_range
+        ).group_by(SalesAggregate.dim_key).order_by({'orders': orders, 'revenue': revenue}[order_by].desc())
+        return query.limit(limit).all() if limit else query.all()
+
+    per_day = db.session.query(
+        SalesAggregate.day, db.func.sum(SalesAggregate.orders), db.func.sum(SalesAggregate.revenue)
+    ).filter(
+        SalesAggregate.dimension == 'status', *in_range,
+        SalesAggregate.dim_key.notin_(EXCLUDED_REVENUE_STATUSES)
+    ).group_by(SalesAggregate.day).order_by(SalesAggregate.day).all()
+
+    top_products = totals('product', 'revenue', 10)
+    names = dict(db.session.query(Product.product_id, Product.product_name).filter(
+        Product.product_id.in_([int(key) for key, *_ in top_products])
+    ).all()) if top_products else {}
+
+    return jsonify({
+        'days': days,
+        'revenue_per_day': [
+            {'day': day.strftime('%Y-%m-%d'), 'orders': int(orders or 0), 'revenue': round(revenue or 0, 2)}
+            for day, orders, revenue in per_day
+        ],
+        'orders_per_status': {key: int(orders) for key, orders, _, _ in totals('status', 'orders') if orders},
+        'top_products': [
+            {'product_id': int(key), 'name': names.get(int(key), f'#{key}'), 'orders': int(orders),
+             'quantity': int(quantity), 'revenue': round(revenue, 2)}
+            for key, orders, quantity, revenue in top_products if orders > 0
+        ],
+        'top_cities': [
+            {'city': key, 'orders': int(orders), 'revenue': round(revenue, 2)}
+            for key, orders, _, revenue in totals('city', 'orders', 10) if orders > 0
+        ]
+    })
+
+# ---------------- EXPORTS ----------------
+# Exports stream one ordered, joined query with yield_per (a server-side
+# cursor on MySQL) and group rows per order/product as they arrive, so
+# memory stays flat however many rows there are. No other query may run on
+# the session while a stream is open.
+EXPORT_CHUNK_ROWS = 1000
+
+ORDER_EXPORT_FIELDS = ['order_id', 'created_at', 'status', 'customer_name', 'customer_phone', 'customer_email',
+                       'customer_address', 'customer_city', 'customer_country', 'shipping_cost', 'total_amount', 'notes']
+ORDER_ITEM_EXPORT_FIELDS = ['product_id', 'product_name', 'unit_price', 'quantity', 'line_total']
+PRODUCT_EXPORT_FIELDS = ['product_id', 'product_name', 'description', 'price', 'discount_price', 'is_special',
+                         'sold_out', 'subcategory_id', 'main_image', 'image_urls', 'tags']
+
+def export_response(records, fmt, filename, csv_header, csv_rows):
+    """Stream records as NDJSON (one object per line) or CSV
+
+    records yields dicts; csv_rows turns one record into CSV rows.
+    """
+    def generate_ndjson():
+        buffer = []
+        for record in records:
+            buffer.append(json.dumps(record, default=str, ensure_ascii=False))
+            if len(buffer) >= EXPORT_CHUNK_ROWS:
+                yield '\n'.join(buffer) + '\n'
+                buffer = []
+        if buffer:
+            yield '\n'.join(buffer) + '\n'
+
+    def generate_csv():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(csv_header)
+        for i, record in enumerate(records, 1):
+            writer.writerows(csv_rows(record))
+            if i % EXPORT_CHUNK_ROWS == 0:
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+        yield out.getvalue()
+
+    if fmt == 'ndjson':
+        body, mimetype, extension = generate_ndjson(), 'application/x-ndjson', 'ndjson'
+    else:
+        body, mimetype, extension = generate_csv(), 'text/csv', 'csv'
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}-{date.today()}.{extension}'
+    return response
+
+def iter_order_exports(filters):
+    """Orders with their line items, oldest first"""
+    columns = [getattr(Order, f) for f in ORDER_EXPORT_FIELDS] + [getattr(OrderItem, f) for f in ORDER_ITEM_EXPORT_FIELDS]
+    stmt = db.select(*columns).outerjoin(OrderItem, OrderItem.order_id == Order.order_id).filter(
+        *filters
+    ).order_by(Order.order_id, OrderItem.id).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+    rows = db.session.execute(stmt)
+    for _, group in groupby(rows, key=lambda row: row.order_id):
+        group = list(group)
+        record = {f: getattr(group[0], f) for f in ORDER_EXPORT_FIELDS}
+        record['created_at'] = record['created_at'].strftime('%Y-%m-%d %H:%M:%S') if record['created_at'] else None
+        record['items'] = [{f: getattr(row, f) for f in ORDER_ITEM_EXPORT_FIELDS} for row in group if row.product_name is not None]
+        yield record
+
+def iter_product_exports():
+    """Products with their specs by spec name"""
+    columns = [getattr(Product, f) for f in PRODUCT_EXPORT_FIELDS] + [SpecType.name.label('spec_name'), ProductSpec.value.label('spec_value')]
+    stmt = db.select(*columns).outerjoin(ProductSpec, ProductSpec.product_id == Product.product_id).outerjoin(
+        SpecType, SpecType.id == ProductSpec.spectype_id
+    ).order_by(Product.product_id, ProductSpec.id).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+    rows = db.session.execute(stmt)
+    for _, group in groupby(rows, key=lambda row: row.product_id):
+        group = list(group)
+        record = {f: getattr(group[0], f) for f in PRODUCT_EXPORT_FIELDS}
+        record['specs'] = {row.spec_name: row.spec_value for row in group if row.spec_name is not None}
+        yield record
+
+@app.route('/api/admin/export/orders')
+@require_admin
+def export_orders():
+    """Export orders with line items. Args: format=csv|ndjson, plus the order list filters.
+
+    CSV has one row per line item (order columns repeated); NDJSON has one order per line.
+    """
+    try:
+        filters = admin_order_filters()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    status = request.args.get('status')
+    if status:
+        filters.append(Order.status == status)
+
+    def csv_rows(record):
+        order_cells = [record[f] for f in ORDER_EXPORT_FIELDS]
+        if not record['items']:
+            return [order_cells + [''] * len(ORDER_ITEM_EXPORT_FIELDS)]
+        return [order_cells + [item[f] for f in ORDER_ITEM_EXPORT_FIELDS] for item in record['items']]
+
+    return export_response(iter_order_exports(filters), request.args.get('format', 'csv'), 'orders',
+                           ORDER_EXPORT_FIELDS + ORDER_ITEM_EXPORT_FIELDS, csv_rows)
+
+@app.route('/api/admin/export/products')
+@require_admin
+def export_products():
+    """Export products with specs. Args: format=csv|ndjson (CSV specs column is JSON)."""
+    def csv_rows(record):
+        return [[record[f] for f in PRODUCT_EXPORT_FIELDS] + [json.dumps(record['specs'], ensure_ascii=False)]]
+
+    return export_response(iter_product_exports(), request.args.get('format', 'csv'), 'products',
+                           PRODUCT_EXPORT_FIELDS + ['specs'], csv_rows)
+
 @app.route('/api/admin/order/<int:order_id>/status', methods=['PUT'])
 @require_admin
 def update_order_status(order_id):
@@ -1660,6 +4341,11 @@ def update_order_status(order_id):
         
         # Create status history entry
         if 'status' in data:
+            if data['status'] != order.status:
+                # Moves the order between statuses - and in or out of the revenue dimensions
+                items = [(item.product_id, item.quantity, item.line_total) for item in order.items]
+                apply_sales_deltas(order_sales_deltas(order, items, sign=-1) +
+                                   order_sales_deltas(order, items, status=data['status']))
             history = OrderStatusHistory(
                 order_id=order_id,
                 status=data['status'],
@@ -1685,6 +4371,9 @@ def delete_order(order_id):
     """Delete an order"""
     try:
         order = Order.query.get_or_404(order_id)
+        apply_sales_deltas(order_sales_deltas(
+            order, [(item.product_id, item.quantity, item.line_total) for item in order.items], sign=-1
+        ))
         db.session.delete(order)
         db.session.commit()
         
@@ -1701,9 +4390,12 @@ def track_product_view():
     if not data or not data.get('product_id'):
         return jsonify({'success': False}), 400
     
+    from flask import session
+    
     view = ProductView(
         product_id=data['product_id'],
-        search_query=data.get('search_query')
+        search_query=data.get('search_query'),
+        visitor_id=session.setdefault('visitor_id', secrets.token_hex(16))
     )
     
     db.session.add(view)
@@ -1711,32 +4403,82 @@ def track_product_view():
     
     return jsonify({'success': True}), 200
 
+# Raw ProductView rows are kept this long, then rolled up into ProductViewDaily
+PRODUCT_VIEW_RETENTION_DAYS = env_int('PRODUCT_VIEW_RETENTION_DAYS', 30)
+
+@scheduled_job(timedelta(hours=24))
+def rollup_product_views():
+    """Fold old ProductView rows into per-day counts and delete them"""
+    cutoff = datetime.combine(date.today() - timedelta(days=PRODUCT_VIEW_RETENTION_DAYS), datetime.min.time())
+
+    view_day = db.func.date(ProductView.viewed_at)
+    counts = db.session.query(ProductView.product_id, view_day, db.func.count(ProductView.id)).filter(
+        ProductView.viewed_at < cutoff
+    ).group_by(ProductView.product_id, view_day).all()
+    if not counts:
+        return
+
+    # SQLite returns DATE() as text
+    counts = [(pid, date.fromisoformat(day) if isinstance(day, str) else day, views) for pid, day, views in counts]
+    existing = {
+        (row.product_id, row.view_date): row
+        for row in ProductViewDaily.query.filter(ProductViewDaily.view_date.in_({day for _, day, _ in counts}))
+    }
+    for product_id, day, views in counts:
+        row = existing.get((product_id, day))
+        if row:
+            row.views += views
+        else:
+            db.session.add(ProductViewDaily(product_id=product_id, view_date=day, views=views))
+
+    ProductView.query.filter(ProductView.viewed_at < cutoff).delete(synchronize_session=False)
+
 #Cleanup task to remove old cached entries
-@app.route('/api/admin/cleanup-cache', methods=['POST'])
-def cleanup_old_cache():
+@scheduled_job(timedelta(hours=6))
+def cleanup_featured_cache():
     """Remove cached products older than 7 days"""
-    from datetime import date, timedelta
-    
     seven_days_ago = date.today() - timedelta(days=7)
     DailyFeatured.query.filter(DailyFeatured.featured_date < seven_days_ago).delete()
-    db.session.commit()
-    
-    return jsonify({'success': True, 'message': 'Old cache cleaned up'})
 
-# Cleanup old cache on startup
-def cleanup_on_startup():
-    from datetime import date, timedelta
-    with app.app_context():
-        seven_days_ago = date.today() - timedelta(days=7)
-        try:
-            DailyFeatured.query.filter(DailyFeatured.featured_date < seven_days_ago).delete()
-            db.session.commit()
-            print("✓ Cleaned up old daily featured cache")
-        except:
-            db.session.rollback()
+@app.route('/api/admin/cleanup-cache', methods=['POST'])
+@require_admin
+def cleanup_old_cache():
+    """Remove cached products older than 7 days"""
+    result = run_job('cleanup_featured_cache')
+    return jsonify({'success': result != 'failed', 'result': result, 'message': 'Old cache cleaned up'})
+
+@app.route('/api/admin/jobs', methods=['GET'])
+@require_admin
+def admin_get_jobs():
+    """Scheduled maintenance jobs with their run-time stats"""
+    states = {s.name: s for s in ScheduledJob.query.all()}
+    jobs = []
+    for name, job in SCHEDULED_JOBS.items():
+        state = states.get(name)
+        runs = state.runs if state and state.runs else 0
+        jobs.append({
+            'name': name,
+            'interval_seconds': int(job['interval'].total_seconds()),
+            'last_started_at': state.last_started_at.strftime('%Y-%m-%d %H:%M:%S') if state and state.last_started_at else None,
+            'last_finished_at': state.last_finished_at.strftime('%Y-%m-%d %H:%M:%S') if state and state.last_finished_at else None,
+            'last_duration_ms': state.last_duration_ms if state else None,
+            'avg_duration_ms': round(state.total_duration_ms / runs) if runs else None,
+            'max_duration_ms': state.max_duration_ms if state else None,
+            'runs': runs,
+            'failures': state.failures if state else 0,
+            'skipped': state.skipped if state else 0,
+            'last_error': state.last_error if state else None
+        })
+    return jsonify(jobs)
 
-# Run cleanup
-cleanup_on_startup()
+@app.route('/api/admin/jobs/<name>/run', methods=['POST'])
+@require_admin
+def admin_run_job(name):
+    """Run a scheduled job now"""
+    if name not in SCHEDULED_JOBS:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    result = run_job(name)
+    return jsonify({'success': result != 'failed', 'result': result})
 
 @app.route('/api/admin/product/<int:product_id>/toggle-stock', methods=['POST'])
 @require_admin
@@ -1745,6 +4487,7 @@ def toggle_product_stock(product_id):
     try:
         product = Product.query.get_or_404(product_id)
         product.sold_out = not product.sold_out
+        catalog_changed()
         db.session.commit()
         
         status = "sold out" if product.sold_out else "in stock"
@@ -1763,6 +4506,7 @@ def clear_sold_out_products():
     """Delete all sold out products"""
     try:
         deleted_count = Product.query.filter_by(sold_out=True).delete()
+        catalog_changed()
         db.session.commit()
         
         return jsonify({
@@ -1900,6 +4644,7 @@ Sitemap: https://autoadeal.com/sitemap.xml
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    with app.app_context():
-        db.create_all()
+    run_startup_tasks()
+    run_warmup_tasks()
+    start_scheduler()
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
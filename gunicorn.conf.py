@@ -0,0 +1,28 @@
+# Gunicorn configuration - loaded automatically from the working directory
+import os
+import shutil
+import tempfile
+
+# Per-worker Prometheus metric files, aggregated by /metrics. Start empty on every boot.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'auto_adeal_metrics'))
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+def on_starting(server):
+    """Run migrations and one-off cleanup once, in the master, before any worker forks"""
+    from app import run_startup_tasks
+    run_startup_tasks()
+
+def post_worker_init(worker):
+    """Warm connections and templates before the worker accepts requests"""
+    from app import run_warmup_tasks, start_scheduler
+    run_warmup_tasks()
+    start_scheduler()
+
+def child_exit(server, worker):
+    """Drop the exited worker's live gauges from /metrics"""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
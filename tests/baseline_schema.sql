@@ -0,0 +1,154 @@
+-- Schema of the original (pre-migration) database, as db.create_all() made it.
+-- Frozen: upgrade tests start from this, so don't edit it to match new models.
+
+CREATE TABLE spec_type (
+	id INTEGER NOT NULL, 
+	name VARCHAR(120) NOT NULL, 
+	value_type VARCHAR(20) NOT NULL, 
+	choices TEXT, 
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE category (
+	category_id INTEGER NOT NULL, 
+	category_name VARCHAR(100) NOT NULL, 
+	slug VARCHAR(100), 
+	PRIMARY KEY (category_id)
+);
+
+CREATE TABLE user (
+	user_id INTEGER NOT NULL, 
+	email VARCHAR(255) NOT NULL, 
+	password_hash VARCHAR(255) NOT NULL, 
+	name VARCHAR(100) NOT NULL, 
+	surname VARCHAR(100) NOT NULL, 
+	created_at DATETIME, 
+	last_login DATETIME, 
+	PRIMARY KEY (user_id), 
+	UNIQUE (email)
+);
+
+CREATE TABLE site_settings (
+	id INTEGER NOT NULL, 
+	setting_key VARCHAR(100) NOT NULL, 
+	setting_value TEXT, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	UNIQUE (setting_key)
+);
+
+CREATE TABLE blog_post (
+	id INTEGER NOT NULL, 
+	title VARCHAR(200) NOT NULL, 
+	content TEXT NOT NULL, 
+	image VARCHAR(255), 
+	slug VARCHAR(200) NOT NULL, 
+	published BOOLEAN, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	UNIQUE (slug)
+);
+
+CREATE TABLE subcategory (
+	subcategory_id INTEGER NOT NULL, 
+	subcategory_name VARCHAR(100) NOT NULL, 
+	slug VARCHAR(100), 
+	category_id INTEGER, 
+	sort_order INTEGER, 
+	PRIMARY KEY (subcategory_id), 
+	FOREIGN KEY(category_id) REFERENCES category (category_id)
+);
+
+CREATE TABLE password_reset (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	token VARCHAR(255) NOT NULL, 
+	expires_at DATETIME NOT NULL, 
+	used BOOLEAN, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES user (user_id), 
+	UNIQUE (token)
+);
+
+CREATE TABLE "order" (
+	order_id INTEGER NOT NULL, 
+	user_id INTEGER, 
+	customer_name VARCHAR(100) NOT NULL, 
+	customer_phone VARCHAR(20) NOT NULL, 
+	customer_email VARCHAR(100), 
+	customer_address VARCHAR(255) NOT NULL, 
+	customer_city VARCHAR(100) NOT NULL, 
+	customer_country VARCHAR(50) NOT NULL, 
+	total_amount FLOAT NOT NULL, 
+	shipping_cost FLOAT NOT NULL, 
+	status VARCHAR(20), 
+	order_items TEXT NOT NULL, 
+	created_at DATETIME, 
+	notes TEXT, 
+	PRIMARY KEY (order_id), 
+	FOREIGN KEY(user_id) REFERENCES user (user_id)
+);
+
+CREATE TABLE subcategory_spectype (
+	subcategory_id INTEGER NOT NULL, 
+	spectype_id INTEGER NOT NULL, 
+	PRIMARY KEY (subcategory_id, spectype_id), 
+	FOREIGN KEY(subcategory_id) REFERENCES subcategory (subcategory_id), 
+	FOREIGN KEY(spectype_id) REFERENCES spec_type (id)
+);
+
+CREATE TABLE product (
+	product_id INTEGER NOT NULL, 
+	product_name VARCHAR(150) NOT NULL, 
+	description TEXT, 
+	price FLOAT NOT NULL, 
+	discount_price FLOAT, 
+	is_special BOOLEAN, 
+	sold_out BOOLEAN, 
+	subcategory_id INTEGER, 
+	main_image VARCHAR(255), 
+	image_urls TEXT, 
+	tags TEXT, 
+	PRIMARY KEY (product_id), 
+	FOREIGN KEY(subcategory_id) REFERENCES subcategory (subcategory_id)
+);
+
+CREATE TABLE order_status_history (
+	id INTEGER NOT NULL, 
+	order_id INTEGER NOT NULL, 
+	status VARCHAR(20) NOT NULL, 
+	notes TEXT, 
+	created_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(order_id) REFERENCES "order" (order_id)
+);
+
+CREATE TABLE product_spec (
+	id INTEGER NOT NULL, 
+	product_id INTEGER NOT NULL, 
+	spectype_id INTEGER NOT NULL, 
+	value TEXT, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(product_id) REFERENCES product (product_id), 
+	FOREIGN KEY(spectype_id) REFERENCES spec_type (id)
+);
+
+CREATE TABLE product_view (
+	id INTEGER NOT NULL, 
+	product_id INTEGER NOT NULL, 
+	search_query VARCHAR(255), 
+	viewed_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(product_id) REFERENCES product (product_id)
+);
+
+CREATE TABLE daily_featured (
+	id INTEGER NOT NULL, 
+	product_id INTEGER NOT NULL, 
+	featured_date DATE NOT NULL, 
+	display_order INTEGER NOT NULL, 
+	weight_category VARCHAR(50), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(product_id) REFERENCES product (product_id)
+);
@@ -0,0 +1,55 @@
+"""Bulk product import"""
+import pytest
+
+from app import app, db, run_migrations, read_import_rows, import_products
+from app import Category, Subcategory, Product, ProductSpec
+
+
+@pytest.fixture
+def product():
+    """One fully filled-in product, removed again afterwards"""
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        category = Category(category_name='Import test')
+        db.session.add(category)
+        db.session.flush()
+        subcategory = Subcategory(subcategory_name='Import test covers', category_id=category.category_id, sort_order=0)
+        db.session.add(subcategory)
+        db.session.flush()
+        product = Product(product_name='Seat cover', price=2500, discount_price=2000, is_special=True, sold_out=True,
+                          subcategory_id=subcategory.subcategory_id, description='Leather', main_image='/static/uploads/1.png',
+                          image_urls='/static/uploads/2.png', tags='seat, cover')
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.product_id
+
+        yield product_id
+
+        db.session.rollback()
+        ProductSpec.query.filter_by(product_id=product_id).delete()
+        Product.query.filter_by(product_id=product_id).delete()
+        Subcategory.query.filter_by(subcategory_id=subcategory.subcategory_id).delete()
+        Category.query.filter_by(category_id=category.category_id).delete()
+        db.session.commit()
+
+
+def test_csv_partial_update_keeps_blank_fields(product):
+    csv_text = ('id,name,price,discount_price,subcategory,is_special,sold_out,description,main_image,image_urls,tags\n'
+                f'{product},,900,,,,,,,,\n')
+    result = import_products(read_import_rows(csv_text, 'products.csv'))
+    assert result['errors'] == [] and result['updated'] == 1
+
+    db.session.expire_all()
+    updated = db.session.get(Product, product)
+    assert updated.price == 900
+    assert (updated.product_name, updated.discount_price, updated.is_special, updated.sold_out) == \
+        ('Seat cover', 2000, True, True)
+    assert (updated.description, updated.main_image, updated.image_urls, updated.tags) == \
+        ('Leather', '/static/uploads/1.png', '/static/uploads/2.png', 'seat, cover')
+
+
+def test_csv_create_still_requires_name(product):
+    result = import_products(read_import_rows('name,price,subcategory\n,900,Import test covers\n', 'products.csv'),
+                             dry_run=True)
+    assert result['errors'] == [{'row': 1, 'error': 'name is required'}]
@@ -0,0 +1,113 @@
+"""Every hot-path query must be served by an index (EXPLAIN), on SQLite and MySQL.
+
+The MySQL tests run against MYSQL_TEST_URL (e.g. mysql+pymysql://user:pw@localhost/auto_adeal_test)
+and are skipped without it. That database's tables are dropped and recreated.
+"""
+import os
+from datetime import datetime, date, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import app, db, hot_path_queries, explain_uses_index, run_migrations
+from app import User, SpecType, Product, ProductSpec, ProductView, DailyFeatured, Order, OrderStatusHistory, PasswordReset
+
+with app.app_context():
+    HOT_PATH_LABELS = [label for label, _ in hot_path_queries()]
+
+
+def seed(conn, rows=300):
+    """Enough rows that a planner prefers an index to a scan"""
+    now = datetime.utcnow()
+    conn.execute(User.__table__.insert(), [
+        {'user_id': i, 'email': f'user{i}@example.com', 'password_hash': 'x', 'name': 'A', 'surname': 'B'}
+        for i in range(1, 21)
+    ])
+    conn.execute(SpecType.__table__.insert(), [
+        {'id': i, 'name': f'Spec {i}', 'value_type': 'text'} for i in range(1, 11)
+    ])
+    conn.execute(Product.__table__.insert(), [
+        {'product_id': i, 'product_name': f'Product {i}', 'price': 100 + i, 'is_special': i % 7 == 0,
+         'sold_out': i % 5 == 0, 'subcategory_id': None, 'main_image': f'/static/uploads/{i}.png' if i % 3 else ''}
+        for i in range(1, rows + 1)
+    ])
+    conn.execute(ProductSpec.__table__.insert(), [
+        {'product_id': i, 'spectype_id': i % 10 + 1, 'value': 'BMW, Audi'} for i in range(1, rows + 1)
+    ])
+    conn.execute(ProductView.__table__.insert(), [
+        {'product_id': i % rows + 1, 'viewed_at': now - timedelta(hours=i)} for i in range(rows)
+    ])
+    conn.execute(DailyFeatured.__table__.insert(), [
+        {'product_id': i % rows + 1, 'featured_date': date.today() - timedelta(days=i // 20), 'display_order': i % 20}
+        for i in range(rows)
+    ])
+    conn.execute(Order.__table__.insert(), [
+        {'order_id': i, 'user_id': i % 20 + 1, 'customer_name': 'A', 'customer_phone': '1', 'customer_address': 'x',
+         'customer_city': 'Tirane', 'customer_country': 'Albania', 'total_amount': 1000, 'shipping_cost': 0,
+         'status': ('pending', 'delivered', 'cancelled')[i % 3], 'order_items': '[]', 'created_at': now - timedelta(hours=i)}
+        for i in range(1, rows + 1)
+    ])
+    conn.execute(OrderStatusHistory.__table__.insert(), [
+        {'order_id': i, 'status': 'pending', 'created_at': now - timedelta(hours=i)} for i in range(1, rows + 1)
+    ])
+    conn.execute(PasswordReset.__table__.insert(), [
+        {'user_id': i % 20 + 1, 'token': f'token-{i}', 'expires_at': now, 'used': i % 2 == 0} for i in range(rows)
+    ])
+
+
+def assert_uses_index(conn, label):
+    with app.app_context():
+        query = dict(hot_path_queries())[label]
+        uses_index, plan = explain_uses_index(conn, query.statement)
+    assert uses_index, f'{label}: {plan}'
+
+
+@pytest.fixture(scope='module')
+def sqlite_conn():
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        with db.engine.begin() as conn:
+            seed(conn)
+            conn.exec_driver_sql('ANALYZE')
+        with db.engine.connect() as conn:
+            yield conn
+
+
+@pytest.fixture(scope='module')
+def mysql_conn():
+    url = os.environ.get('MYSQL_TEST_URL')
+    if not url:
+        pytest.skip('MYSQL_TEST_URL not set')
+    engine = create_engine(url)
+    try:
+        engine.connect().close()
+    except Exception as e:
+        pytest.skip(f'MySQL not available: {e}')
+
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        seed(conn)
+        for table in ('product', 'product_spec', 'product_view', 'daily_featured', '`order`',
+                      'order_status_history', 'password_reset'):
+            conn.exec_driver_sql(f'ANALYZE TABLE {table}')
+    with engine.connect() as conn:
+        yield conn
+    db.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize('label', HOT_PATH_LABELS)
+def test_sqlite_hot_path_uses_index(sqlite_conn, label):
+    assert_uses_index(sqlite_conn, label)
+
+
+@pytest.mark.parametrize('label', HOT_PATH_LABELS)
+def test_mysql_hot_path_uses_index(mysql_conn, label):
+    assert_uses_index(mysql_conn, label)
+
+
+def test_sqlite_full_scan_is_reported(sqlite_conn):
+    uses_index, plan = explain_uses_index(sqlite_conn, Product.query.filter(Product.price > 150).statement)
+    assert not uses_index, plan
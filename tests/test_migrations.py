@@ -0,0 +1,84 @@
+"""Upgrading a database created before the migration runner existed"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_schema.sql')
+
+
+def flask(db_path, *args):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    return subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', *args],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def schema(db_path):
+    """{table: (columns, index names)} of a SQLite database"""
+    conn = sqlite3.connect(db_path)
+    tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    result = {}
+    for table in tables:
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+        indexes = {row[1] for row in conn.execute(f'PRAGMA index_list("{table}")') if not row[1].startswith('sqlite_')}
+        result[table] = (columns, indexes)
+    conn.close()
+    return result
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """A database with the original schema and a little data in it"""
+    db_path = tmp_path / 'baseline.db'
+    conn = sqlite3.connect(db_path)
+    with open(BASELINE_SCHEMA) as f:
+        conn.executescript(f.read())
+    conn.executescript("""
+        INSERT INTO category (category_id, category_name) VALUES (1, 'Interior');
+        INSERT INTO subcategory (subcategory_id, subcategory_name, category_id, sort_order) VALUES (1, 'Covers', 1, 0);
+        INSERT INTO product (product_id, product_name, price, is_special, sold_out, subcategory_id, main_image)
+            VALUES (1, 'Seat cover', 2500, 0, 0, 1, '/static/uploads/1.png');
+        INSERT INTO product_view (product_id, viewed_at) VALUES (1, '2024-01-01 10:00:00');
+        INSERT INTO blog_post (title, content, slug, published, created_at, updated_at)
+            VALUES ('Hello', 'Some words about cars', 'hello', 1, '2024-01-01 10:00:00', '2024-01-01 10:00:00');
+    """)
+    conn.execute(
+        'INSERT INTO "order" (customer_name, customer_phone, customer_address, customer_city, customer_country, '
+        'total_amount, shipping_cost, status, order_items, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        ('Ana', '0690000000', 'Rruga 1', 'Tirane', 'Albania', 5000, 0, 'delivered',
+         json.dumps([{'product_id': 1, 'name': 'Seat cover', 'price': 2500, 'quantity': 2}]), '2024-01-02 10:00:00')
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_migrate_upgrades_baseline_database(baseline_db):
+    result = flask(baseline_db, 'migrate')
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    conn = sqlite3.connect(baseline_db)
+    applied = {version for (version,) in conn.execute('SELECT version FROM schema_migration')}
+    assert applied == set(range(1, max(applied) + 1)) and len(applied) >= 5
+    assert conn.execute('SELECT quantity, line_total FROM order_item').fetchall() == [(2, 5000.0)]
+    assert conn.execute('SELECT excerpt, reading_time FROM blog_post').fetchone() == ('Some words about cars', 1)
+    conn.close()
+
+
+def test_migrated_schema_matches_fresh_schema(baseline_db, tmp_path):
+    fresh_db = tmp_path / 'fresh.db'
+    for db_path in (baseline_db, fresh_db):
+        result = flask(db_path, 'migrate')
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    assert schema(baseline_db) == schema(fresh_db)
+
+
+def test_migrate_is_idempotent(baseline_db):
+    for _ in range(2):
+        result = flask(baseline_db, 'migrate')
+        assert result.returncode == 0, result.stdout + result.stderr